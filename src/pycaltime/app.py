@@ -3,15 +3,18 @@
 from datetime import datetime
 from typing import Any
 
-from flask import Flask, send_from_directory
+from flask import Blueprint, Flask, send_from_directory
 from flask.typing import ResponseReturnValue
 from flask_bootstrap import Bootstrap5
+from flask_dance.consumer import oauth_authorized
 from flask_dance.contrib.google import make_google_blueprint
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from pycaltime.cli import bootstrap_command, migrate_command, sync_command
 from pycaltime.config import config
-from pycaltime.dashboard.home import dashboard_blueprint
-from pycaltime.storage import initialize_database
+from pycaltime.dashboard import LazyView, dashboard_blueprint
+from pycaltime.google import invalidate_calendar_metadata, invalidate_user_info
+from pycaltime.stages import add_server_timing
 
 
 # Flask app factory
@@ -46,11 +49,30 @@ def create_app(test_config: dict[str, Any] | None = None) -> Flask:
             "https://www.googleapis.com/auth/calendar.readonly",
         ],
         redirect_to="dashboard.home",
+        offline=True,
     )
     app.register_blueprint(google_blueprint, url_prefix="/login")
+    notifications_blueprint = Blueprint("notifications", __name__)
+    notifications_blueprint.add_url_rule(
+        "/calendar",
+        view_func=LazyView("pycaltime.notifications.calendar_notification"),
+        methods=["POST"],
+    )
+    app.register_blueprint(notifications_blueprint, url_prefix="/notifications")
+
+    # refresh cached user information and calendar metadata on login
+    @oauth_authorized.connect_via(google_blueprint)
+    def logged_in(_blueprint: Blueprint, **_kwargs: object) -> None:
+        invalidate_user_info()
+        invalidate_calendar_metadata()
+
+    # report the time taken by each stage of the request
+    app.after_request(add_server_timing)
 
-    # initialise database
-    initialize_database()
+    # register commands
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(sync_command)
 
     # for the jinja2 templates
     # @app.context_processor
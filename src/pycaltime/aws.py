@@ -1,8 +1,81 @@
 """AWS Lambda Handler."""
 
-from apig_wsgi import make_lambda_handler
+from time import monotonic
+from typing import Any
 
-from pycaltime.app import create_app
+from pycaltime.config import config
 
-# WSGI entry point for AWS Lambda functions
-lambda_handler = make_lambda_handler(create_app())
+# start loading the secrets, while the app is imported
+config.prefetch()
+
+from apig_wsgi import make_lambda_handler  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from pycaltime.app import create_app  # noqa: E402
+
+# Key of the asynchronous invocation events that refresh a user's timesheets
+REFRESH_EVENT = "pycaltime_refresh"
+
+# Time left for the users being synced to finish, when a scheduled sync stops
+SYNC_MARGIN_SECONDS = 60
+
+_app = None
+_handler = None
+
+
+def _get_app() -> Flask:
+    """The app, created on first use.
+
+    Returns:
+        Flask: the app
+    """
+    global _app, _handler
+    if _app is None:
+        _app = create_app()
+        _handler = make_lambda_handler(_app)
+    return _app
+
+
+def lambda_handler(event: dict[str, Any], context: object) -> dict[str, Any]:
+    """WSGI entry point for AWS Lambda functions, creating the app on first use.
+
+    Timesheet refreshes, invoked asynchronously by the function itself, are run
+    outside WSGI.
+
+    Args:
+        event (dict[str, Any]): the Lambda event
+        context (object): the Lambda context
+
+    Returns:
+        dict[str, Any]: the response
+    """
+    app = _get_app()
+    if REFRESH_EVENT in event:
+        from pycaltime.refresh import run_refresh
+
+        run_refresh(app, event[REFRESH_EVENT])
+        return {}
+    return _handler(event, context)
+
+
+def scheduled_handler(
+    event: dict[str, Any],  # noqa: ARG001
+    context: Any,  # noqa: ANN401
+) -> dict[str, int]:
+    """Entry point for the scheduled sync of every user's timesheets.
+
+    Users not started before the function is close to timing out are left for the
+    next run.
+
+    Args:
+        event (dict[str, Any]): the Lambda event
+        context (Any): the Lambda context
+
+    Returns:
+        dict[str, int]: the number of users synced, unchanged, skipped and failed
+    """
+    from pycaltime.scheduled import sync_all_users
+
+    remaining = context.get_remaining_time_in_millis() / 1000
+    deadline = monotonic() + remaining - SYNC_MARGIN_SECONDS
+    return sync_all_users(_get_app(), deadline)
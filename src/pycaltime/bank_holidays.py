@@ -1,8 +1,38 @@
-"""Bank Holidays."""
+"""Bank Holidays.
 
-from datetime import date
+Bank holidays are read from a snapshot bundled with the package, or the newer copy
+cached in the temp directory, and indexed by year. The copy is refreshed from gov.uk
+in a background thread, using a conditional GET, so lookups never wait for the
+network.
+"""
 
-from requests import codes, get
+from contextlib import suppress
+from datetime import date, timedelta
+from importlib.resources import files
+from json import dumps, loads
+from pathlib import Path
+from tempfile import gettempdir
+from threading import Lock, Thread
+from time import time
+
+from requests import RequestException, codes, get
+
+BANK_HOLIDAYS_URL = "https://www.gov.uk/bank-holidays.json"
+
+# The cached copy of the gov.uk data
+CACHE_PATH = Path(gettempdir()) / "pycaltime-bank-holidays.json"
+
+# How often to check gov.uk for changes
+REFRESH_INTERVAL = timedelta(days=1)
+
+# Bank holidays by year, and by name and date
+_holidays: dict[int, dict[str, date]] = {}
+
+# The cached copy, with the etag, last-modified and checked time of the download
+_cache: dict[str, str | float | None] = {}
+
+_lock = Lock()
+_refresh: Thread | None = None
 
 
 def bank_holidays(year: int) -> dict[str, date]:
@@ -14,17 +44,86 @@ def bank_holidays(year: int) -> dict[str, date]:
     Returns:
         dict[str, date]: dict of bank holidays, by name and date
     """
-    # get list of UK bank holidays
-    response = get("https://www.gov.uk/bank-holidays.json", timeout=5)
-    if response.status_code != codes.ok:
-        return {}
-    data = response.json()
-
-    # extract for the current year
-    results = {}
-    for event in data["england-and-wales"]["events"]:
-        timestamp = date.fromisoformat(event["date"])
-        if timestamp.year == year:
-            results[event["title"]] = timestamp
+    global _refresh
+
+    with _lock:
+        if not _cache:
+            _load()
+
+        # start a background refresh, if due
+        if time() - _cache["checked"] > REFRESH_INTERVAL.total_seconds() and (
+            _refresh is None or not _refresh.is_alive()
+        ):
+            _refresh = Thread(target=refresh_bank_holidays, daemon=True)
+            _refresh.start()
+
+        return dict(_holidays.get(year, {}))
+
+
+def refresh_bank_holidays() -> None:
+    """Download the latest bank holidays from gov.uk, if they have changed.
+
+    Network errors and malformed downloads are ignored, leaving the current bank
+    holidays in place until the next refresh.
+    """
+    global _holidays
 
-    return results
+    headers = {}
+    if _cache.get("etag"):
+        headers["If-None-Match"] = _cache["etag"]
+    if _cache.get("last_modified"):
+        headers["If-Modified-Since"] = _cache["last_modified"]
+
+    try:
+        response = get(BANK_HOLIDAYS_URL, headers=headers, timeout=5)
+    except RequestException:
+        response = None
+
+    # index the download first, so a malformed one leaves the current index in place
+    holidays = None
+    if response is not None and response.status_code == codes.ok:
+        with suppress(ValueError, KeyError, TypeError):
+            holidays = _index(response.text)
+
+    with _lock:
+        _cache["checked"] = time()
+        if holidays is not None:
+            _cache["etag"] = response.headers.get("ETag")
+            _cache["last_modified"] = response.headers.get("Last-Modified")
+            _cache["data"] = response.text
+            _holidays = holidays
+        with suppress(OSError):
+            CACHE_PATH.write_text(dumps(_cache))
+
+
+def _load() -> None:
+    """Load the cached copy, or the bundled snapshot if there isn't a valid one."""
+    global _holidays
+
+    try:
+        cached = loads(CACHE_PATH.read_text())
+        holidays = _index(cached["data"])
+    except (OSError, ValueError, KeyError, TypeError):
+        cached = {
+            "data": files("pycaltime").joinpath("data/bank-holidays.json").read_text()
+        }
+        holidays = _index(cached["data"])
+    _cache.clear()
+    _cache.update({"etag": None, "last_modified": None, "checked": 0.0} | cached)
+    _holidays = holidays
+
+
+def _index(data: str) -> dict[int, dict[str, date]]:
+    """Index the England and Wales bank holidays by year.
+
+    Args:
+        data (str): the gov.uk bank holidays json
+
+    Returns:
+        dict[int, dict[str, date]]: the bank holidays of each year, by name and date
+    """
+    holidays: dict[int, dict[str, date]] = {}
+    for event in loads(data)["england-and-wales"]["events"]:
+        timestamp = date.fromisoformat(event["date"])
+        holidays.setdefault(timestamp.year, {})[event["title"]] = timestamp
+    return holidays
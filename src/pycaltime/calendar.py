@@ -1,11 +1,64 @@
 """Calendar."""
 
-from datetime import UTC, date, datetime
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import replace
+from datetime import UTC, date, datetime, timedelta
+from hashlib import sha256
 from itertools import groupby
+from json import dumps
+from typing import Any
 
-from pycaltime.google import CalendarEvent, iterate_events
-from pycaltime.storage import Timesheet, UserData
-from pycaltime.utils import first_day_of_the_week
+from pycaltime.google import (
+    CALENDAR_METADATA_TTL,
+    CalendarEvent,
+    EventChanges,
+    SyncTokenExpiredError,
+    get_calendar_timezone,
+    invalidate_calendar_metadata,
+    iterate_events,
+    merge_events,
+    sync_events,
+)
+from pycaltime.storage import EventWeek, Timesheet, UserData, WeekEvents
+from pycaltime.utils import first_day_of_the_week, iterate_weeks
+
+# Timesheet categories
+CATEGORIES = ("work", "holiday", "bank", "sick")
+
+
+def user_timezone(user_data: UserData) -> str:
+    """Timezone of the user's primary calendar.
+
+    The timezone is cached on the UserData, and refreshed after
+    CALENDAR_METADATA_TTL.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        str: the timezone string
+    """
+    now = datetime.now(UTC)
+    if (
+        user_data.calendar_timezone is None
+        or user_data.calendar_metadata_updated is None
+        or now - user_data.calendar_metadata_updated > CALENDAR_METADATA_TTL
+    ):
+        user_data.calendar_timezone = get_calendar_timezone()
+        user_data.calendar_metadata_updated = now
+    return user_data.calendar_timezone
+
+
+def invalidate_user_timezone(user_data: UserData) -> None:
+    """Clear the cached calendar metadata, from both the UserData and session.
+
+    Args:
+        user_data (UserData): the user
+    """
+    user_data.calendar_timezone = None
+    user_data.calendar_metadata_updated = None
+    invalidate_calendar_metadata()
 
 
 def process_buffer_events(events: list[CalendarEvent]) -> None:
@@ -39,42 +92,378 @@ def process_buffer_events(events: list[CalendarEvent]) -> None:
                 )
 
 
-def update_timesheets(
+def sync_changes(
+    start: date,
+    calendar_ids: list[str],
+    sync_tokens: dict[str, str],
+    calendar_timezone: str,
+) -> list[EventChanges]:
+    """List the changes to some calendars, with an incremental sync.
+
+    Takes the sync tokens and timezone rather than the UserData, so can run
+    alongside loading the timesheets.
+
+    Args:
+        start (date): first week to keep in sync
+        calendar_ids (list[str]): the calendar ids
+        sync_tokens (dict[str, str]): the sync token of each calendar
+        calendar_timezone (str): the first calendar's timezone
+
+    Returns:
+        list[EventChanges]: the changes to each calendar, or an empty list if a full
+            sync is needed
+    """
+    if sync_tokens.keys() != set(calendar_ids):
+        return []
+
+    try:
+        return [
+            sync_events(sync_tokens[x], start, x, calendar_timezone)
+            for x in calendar_ids
+        ]
+    except SyncTokenExpiredError:
+        return []
+
+
+def sync_timesheets(
     start: date,
     finish: date,
     user_data: UserData,
+    changes: list[EventChanges] | None = None,
 ) -> None:
-    """Update timesheets, adding them to the UserData object."""
-    job_hashtags = {job.hashtag.lower() for job in user_data.jobs}
-    job_for_hashtag = {job.hashtag.lower(): job for job in user_data.jobs}
+    """Update timesheets using an incremental sync.
+
+    The first sync lists every event from start onwards in each of the user's
+    calendars, and stores their sync tokens on the UserData. Later syncs list only
+    the events changed since then, and fetch the weeks they affect. Timesheets are
+    recalculated for the fetched weeks whose events have changed in the event
+    store, and for any weeks between start and finish that have no timesheets yet.
+    A full sync is repeated if a token expires, or the calendars change. If the
+    jobs have changed, the timesheets are first recalculated from the event store.
 
-    # for start_of_the_week, events in group_events_by_week(start, end, calendar_id):
+    Moved and deleted events are located using the EventWeeks table, which indexes
+    the events of every stored week, so changes to events from before start are
+    found too. Cancelled events are removed from the index.
+
+    Args:
+        start (date): first week to keep in sync
+        finish (date): end of the weeks to keep in sync
+        user_data (UserData): the user
+        changes (list[EventChanges] | None, optional): the changes listed by
+            sync_changes, listed here when None. Defaults to None.
+    """
+    timezone = user_timezone(user_data)
+    calendar_ids = user_data.calendars()
+    if changes is None:
+        changes = sync_changes(start, calendar_ids, user_data.sync_tokens, timezone)
+    if user_data.jobs_changed():
+        recalculate_timesheets(user_data)
+
+    events = list(merge_events(*(x.events for x in changes)))
+    cancelled = {event_id for x in changes for event_id in x.cancelled}
+    employment_start = min(
+        (job.employment_start.date() for job in user_data.jobs), default=start
+    )
+
+    if not changes:
+        # full sync, keeping only the events before finish
+        changes = [sync_events(None, start, x, timezone) for x in calendar_ids]
+        events = list(merge_events(*(x.events for x in changes)))
+        fetched = {week: [] for week in iterate_weeks(start, finish)}
+        fetched |= group_events_by_week(x for x in events if x.start.date() < finish)
+        forget_events(
+            user_data,
+            {x.event_id for x in load_event_weeks(user_data, start)}
+            - {event.id for x in fetched.values() for event in x},
+        )
+        store_week_events(user_data, fetched)
+        add_events(fetched, user_data)
+    else:
+        # incremental sync, finding the weeks affected by the changes
+        weeks = {
+            first_day_of_the_week(x.start.date())
+            for x in events
+            if employment_start <= x.start.date() < finish
+        }
+        weeks |= {
+            date.fromisoformat(item.week)
+            for item in EventWeek.batch_get(
+                [(user_data.id, x) for x in {event.id for event in events} | cancelled]
+            )
+        }
+
+        # find the weeks without timesheets, and check the event store for them
+        missing = {
+            week
+            for week in iterate_weeks(start, finish)
+            if any(week not in job.timesheets for job in user_data.jobs)
+        }
+        stored = (
+            load_week_events(user_data, min(missing), max(missing) + timedelta(weeks=1))
+            if missing
+            else {}
+        )
+
+        fetched = fetch_week_events(
+            sorted(weeks | (missing - stored.keys())), calendar_ids, timezone
+        )
+        changed = store_week_events(user_data, fetched)
+        add_events(
+            {week: stored[week] for week in missing if week in stored}
+            | {week: fetched[week] for week in fetched if week in changed | missing},
+            user_data,
+        )
+        forget_events(user_data, cancelled)
+
+    user_data.sync_tokens = {
+        x: y.sync_token for x, y in zip(calendar_ids, changes, strict=True)
+    }
+    user_data.update_flexi()
+    user_data.timesheets_jobs = user_data.jobs_version()
+    user_data.last_updated = datetime.now(UTC)
+
+
+def recalculate_timesheets(user_data: UserData) -> None:
+    """Recalculate timesheets from the event store, without using the calendar.
+
+    Used after changes to the jobs, such as the hashtag or contracted hours, so
+    every stored week is recalculated, and the ledger is rebuilt from the start of
+    employment.
+
+    Args:
+        user_data (UserData): the user
+    """
+    add_events(load_week_events(user_data, date.min, date.max), user_data)
+    user_data.update_flexi(
+        min(
+            (
+                first_day_of_the_week(job.employment_start.date())
+                for job in user_data.jobs
+            ),
+            default=None,
+        )
+    )
+    user_data.timesheets_jobs = user_data.jobs_version()
+
+
+def group_events_by_week(
+    events: Iterable[CalendarEvent],
+) -> dict[date, list[CalendarEvent]]:
+    """Group events by week, and process the buffer events of each week.
+
+    Args:
+        events (Iterable[CalendarEvent]): the events, sorted by start
+
+    Returns:
+        dict[date, list[CalendarEvent]]: the events for each week
+    """
+    result = {}
     for week, group in groupby(
-        iterate_events(start, finish),
+        events,
         key=lambda x: first_day_of_the_week(x.start.date()),
     ):
-        # process the buffer events
-        events = list(group)
-        process_buffer_events(events)
+        result[week] = list(group)
+        process_buffer_events(result[week])
+    return result
+
+
+def fetch_week_events(
+    weeks: list[date], calendar_ids: list[str], calendar_timezone: str
+) -> dict[date, list[CalendarEvent]]:
+    """Fetch the events for some weeks from the calendars.
 
-        # create blank timesheets
-        for job in user_data.jobs:
-            job.timesheets[week] = Timesheet()
+    Args:
+        weeks (list[date]): the weeks, in ascending order
+        calendar_ids (list[str]): the calendar ids
+        calendar_timezone (str): the first calendar's timezone
 
-        # process events
+    Returns:
+        dict[date, list[CalendarEvent]]: the events for each week
+    """
+    result = {week: [] for week in weeks}
+
+    # fetch each run of consecutive weeks
+    for _, run in groupby(enumerate(weeks), key=lambda x: x[1] - timedelta(weeks=x[0])):
+        run_weeks = [week for _, week in run]
+        events = iterate_events(
+            run_weeks[0],
+            run_weeks[-1] + timedelta(weeks=1),
+            calendar_ids=calendar_ids,
+            calendar_timezone=calendar_timezone,
+        )
+        result |= group_events_by_week(events)
+    return result
+
+
+def load_week_events(
+    user_data: UserData, start: date, finish: date
+) -> dict[date, list[CalendarEvent]]:
+    """Load events from the event store.
+
+    Args:
+        user_data (UserData): the user
+        start (date): start date
+        finish (date): finish date
+
+    Returns:
+        dict[date, list[CalendarEvent]]: the events for each stored week
+    """
+    items = WeekEvents.query(
+        user_data.id,
+        WeekEvents.week.between(start.isoformat(), finish.isoformat()),
+    )
+    return {
+        date.fromisoformat(item.week): [from_record(x) for x in item.events]
+        for item in items
+        if item.week < finish.isoformat()
+    }
+
+
+def store_week_events(
+    user_data: UserData, week_events: dict[date, list[CalendarEvent]]
+) -> set[date]:
+    """Save events to the event store, writing only the weeks that have changed.
+
+    The events of the changed weeks are indexed in the EventWeeks table too.
+
+    Args:
+        user_data (UserData): the user
+        week_events (dict[date, list[CalendarEvent]]): the events for each week
+
+    Returns:
+        set[date]: the weeks that have changed
+    """
+    items = {
+        week: WeekEvents(
+            user_id=user_data.id,
+            week=week.isoformat(),
+            events=[to_record(x) for x in events],
+        )
+        for week, events in week_events.items()
+    }
+    for item in items.values():
+        item.content_hash = sha256(
+            dumps(item.events, sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    stored_hashes = {
+        date.fromisoformat(item.week): item.content_hash
+        for item in WeekEvents.batch_get(
+            [(user_data.id, week.isoformat()) for week in items],
+            attributes_to_get=["week", "content_hash"],
+        )
+    }
+
+    changed = {
+        week
+        for week, item in items.items()
+        if stored_hashes.get(week) != item.content_hash
+    }
+    with WeekEvents.batch_write() as batch, EventWeek.batch_write() as index:
+        for week in changed:
+            batch.save(items[week])
+            for event in week_events[week]:
+                index.save(EventWeek(user_data.id, event.id, week=week.isoformat()))
+    return changed
+
+
+def load_event_weeks(user_data: UserData, start: date) -> Iterable[EventWeek]:
+    """List the indexed events stored in the weeks from start onwards.
+
+    Args:
+        user_data (UserData): the user
+        start (date): start date
+
+    Returns:
+        Iterable[EventWeek]: the index entries
+    """
+    return EventWeek.query(
+        user_data.id, filter_condition=EventWeek.week >= start.isoformat()
+    )
+
+
+def forget_events(user_data: UserData, event_ids: Iterable[str]) -> None:
+    """Remove events from the index of stored events.
+
+    Args:
+        user_data (UserData): the user
+        event_ids (Iterable[str]): the event ids
+    """
+    with EventWeek.batch_write() as batch:
+        for event_id in event_ids:
+            batch.delete(EventWeek(user_data.id, event_id))
+
+
+def to_record(event: CalendarEvent) -> dict[str, Any]:
+    """Normalize an event for the event store.
+
+    The description is replaced by the hashtags, which is all the timesheets need.
+
+    Args:
+        event (CalendarEvent): the event
+
+    Returns:
+        dict[str, Any]: the event record
+    """
+    return {
+        "id": event.id,
+        "title": event.title,
+        "hashtags": sorted(event.hashtags()),
+        "start": event.start.isoformat(),
+        "finish": event.finish.isoformat(),
+        "location": event.location,
+    }
+
+
+def from_record(record: dict[str, Any]) -> CalendarEvent:
+    """Create an event from an event store record.
+
+    Args:
+        record (dict[str, Any]): the event record
+
+    Returns:
+        CalendarEvent: the event
+    """
+    return CalendarEvent(
+        title=record["title"],
+        description=" ".join(record["hashtags"]),
+        location=record["location"],
+        start=datetime.fromisoformat(record["start"]),
+        finish=datetime.fromisoformat(record["finish"]),
+        id=record["id"],
+    )
+
+
+def add_events(
+    week_events: dict[date, list[CalendarEvent]], user_data: UserData
+) -> None:
+    """Replace the timesheets for some weeks with the totals of their events.
+
+    Args:
+        week_events (dict[date, list[CalendarEvent]]): the events for each week
+        user_data (UserData): the user
+    """
+    jobs = {job.hashtag.lower(): job for job in user_data.jobs}
+
+    for week, events in week_events.items():
+        # total the minutes by job and category, parsing each event once
+        minutes: Counter[tuple[str, str]] = Counter()
         for event in events:
-            # extract event information
-            for x in job_hashtags & event.hashtags():
-                if "#holiday" in event.hashtags():
-                    job_for_hashtag[x].timesheets[week].holiday += event.duration()
-                elif "#bank" in event.hashtags():
-                    job_for_hashtag[x].timesheets[week].bank += event.duration()
-                elif "#sick" in event.hashtags():
-                    job_for_hashtag[x].timesheets[week].sick += event.duration()
+            hashtags = event.hashtags()
+            matched = jobs.keys() & hashtags
+            if not matched:
+                continue
+            duration = event.duration()
+            category = event.category()
+            for hashtag in matched:
+                if category == "work":
+                    minutes[hashtag, category] += duration // len(matched)
                 else:
-                    job_for_hashtag[x].timesheets[week].work += event.duration() // len(
-                        job_hashtags & event.hashtags()
-                    )
+                    minutes[hashtag, category] += duration
 
-    user_data.update_flexi()
-    user_data.last_updated = datetime.now(UTC)
+        # replace the timesheets, keeping the running totals
+        for hashtag, job in jobs.items():
+            job.timesheets[week] = replace(
+                job.timesheets.get(week, Timesheet()),
+                **{name: minutes[hashtag, name] for name in CATEGORIES},
+            )
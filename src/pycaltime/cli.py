@@ -0,0 +1,60 @@
+"""Flask command line interface, for deployment tasks."""
+
+import click
+from flask import current_app
+
+# DynamoDB billing modes, as named by pynamodb.constants, which isn't imported so
+# that the app starts without loading pynamodb
+PROVISIONED_BILLING_MODE = "PROVISIONED"
+PAY_PER_REQUEST_BILLING_MODE = "PAY_PER_REQUEST"
+
+
+@click.command("bootstrap")
+@click.option(
+    "--billing-mode",
+    type=click.Choice([PROVISIONED_BILLING_MODE, PAY_PER_REQUEST_BILLING_MODE]),
+    default=PROVISIONED_BILLING_MODE,
+    show_default=True,
+    help="DynamoDB billing mode.",
+)
+@click.option(
+    "--read-capacity",
+    default=1,
+    show_default=True,
+    help="Read capacity units, when provisioned.",
+)
+@click.option(
+    "--write-capacity",
+    default=1,
+    show_default=True,
+    help="Write capacity units, when provisioned.",
+)
+def bootstrap_command(
+    billing_mode: str, read_capacity: int, write_capacity: int
+) -> None:
+    """Create and migrate the DynamoDB tables."""
+    from pycaltime.storage import initialize_database
+
+    initialize_database(billing_mode, read_capacity, write_capacity)
+    click.echo("Database initialized.")
+
+
+@click.command("migrate")
+def migrate_command() -> None:
+    """Migrate every user's data to the current storage layout.
+
+    Run after deploying, as the previous release can't read the migrated data.
+    """
+    from pycaltime.storage import migrate_database
+
+    migrate_database()
+    click.echo("Database migrated.")
+
+
+@click.command("sync")
+def sync_command() -> None:
+    """Refresh the timesheets of every user with offline access."""
+    from pycaltime.scheduled import sync_all_users
+
+    counts = sync_all_users(current_app._get_current_object())  # noqa: SLF001
+    click.echo(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "No users.")
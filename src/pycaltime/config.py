@@ -1,58 +1,170 @@
 """System configuration."""
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
 from functools import cached_property
 from json import loads
 from os import environ
-
-import boto3
+from threading import Lock
+from typing import Any
 
 # Required for Flash Dance - https://flask-dance.readthedocs.io/en/v0.8.0/quickstarts/google.html
 environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "0"  # noqa: S105
 
 
+class Setting:
+    """A configuration setting.
+
+    Read from the environment variable of the same name if set, and otherwise from
+    AWS Secrets Manager on first use.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        """Record the setting name.
+
+        Args:
+            owner (type): the Config class
+            name (str): the setting name
+        """
+        self.name = name
+
+    def __get__(self, instance: "Config | None", owner: type) -> Any:  # noqa: ANN401
+        """Resolve the setting.
+
+        Args:
+            instance (Config | None): the configuration
+            owner (type): the Config class
+
+        Returns:
+            Any: the setting value, or the Setting when accessed on the class
+        """
+        if instance is None:
+            return self
+        if self.name in environ:
+            return environ[self.name]
+        return instance.aws_secrets[self.name]
+
+
 class Config:
-    """Configuration settings."""
+    """Configuration settings.
+
+    Nothing is loaded until a setting is used, so importing the configuration never
+    waits on the network.
+    """
 
     def __init__(self) -> None:
         """Initialize."""
-        self.FLASK_SECRET_KEY = self.aws_secrets["FLASK_SECRET_KEY"]
-        self.GOOGLE_CLIENT_ID = self.aws_secrets["GOOGLE_CLIENT_ID"]
-        self.GOOGLE_CLIENT_SECRET = self.aws_secrets["GOOGLE_CLIENT_SECRET"]
-        self.GOOGLE_MAPS_API_KEY = self.aws_secrets["GOOGLE_MAPS_API_KEY"]
-        self.AWS_REGION = self.aws_secrets["AWS_REGION"]
+        self._lock = Lock()
+        self._secrets: Future[dict[str, str]] | None = None
 
     # FLASK_SECRET_KEY - Must be unique per installation
     # python -c 'import secrets; print(secrets.token_hex())'
     # '192b9bdd22ab9ed4d12e236c78afcb9a393ec15f71bbf5dc987d54727823bcbf'"""
-    FLASK_SECRET_KEY = None
+    FLASK_SECRET_KEY = Setting()
 
     # GOOGLE_CLIENT_ID - from the Google console
-    GOOGLE_CLIENT_ID = None
+    GOOGLE_CLIENT_ID = Setting()
 
     # GOOGLE_CLIENT_SECRET - from the Google console
-    GOOGLE_CLIENT_SECRET = None
+    GOOGLE_CLIENT_SECRET = Setting()
 
     # GOOGLE_MAPS_API_KEY - from the Google console
-    GOOGLE_MAPS_API_KEY = None
+    GOOGLE_MAPS_API_KEY = Setting()
 
-    # AWS_REGION
-    AWS_REGION = None
+    @property
+    def AWS_REGION(self) -> str:  # noqa: N802
+        """AWS region, from the environment.
 
-    @cached_property
+        Returns:
+            str: the region
+        """
+        return environ.get("AWS_REGION", "eu-west-2")
+
+    @property
+    def TIMESHEET_MAX_AGE(self) -> timedelta:  # noqa: N802
+        """Age of timesheets that are shown without a refresh, from the environment.
+
+        Returns:
+            timedelta: the maximum age, 5 minutes unless set in seconds
+        """
+        return timedelta(seconds=int(environ.get("TIMESHEET_MAX_AGE", "300")))
+
+    @property
+    def NOTIFICATION_URL(self) -> str | None:  # noqa: N802
+        """Public https address of the calendar notification webhook.
+
+        Calendars are only watched for changes when this is set in the environment.
+
+        Returns:
+            str | None: the address, or None
+        """
+        return environ.get("NOTIFICATION_URL") or None
+
+    def prefetch(self) -> None:
+        """Start loading secrets from AWS Secrets Manager in the background.
+
+        Nothing is loaded if every setting is overridden by the environment.
+        """
+        settings = [k for k, v in vars(Config).items() if isinstance(v, Setting)]
+        if not all(x in environ for x in settings):
+            self._start_loading_secrets()
+
+    @property
     def aws_secrets(self) -> dict[str, str]:
-        """Load secrets from AWS Secrets Manager.
+        """Secrets from AWS Secrets Manager, waiting for them to load if needed.
 
         Returns:
             dict[str, str]: dictionary of secrets
         """
-        region = environ.get("AWS_REGION") if "AWS_REGION" in environ else "eu-west-2"
+        return self._start_loading_secrets().result()
+
+    def _start_loading_secrets(self) -> Future[dict[str, str]]:
+        """Start loading secrets in a background thread, unless already started.
+
+        Returns:
+            Future[dict[str, str]]: the secrets
+        """
+        with self._lock:
+            if self._secrets is None:
+                executor = ThreadPoolExecutor(max_workers=1)
+                self._secrets = executor.submit(self._load_secrets)
+                executor.shutdown(wait=False)
+            return self._secrets
+
+    @cached_property
+    def secrets_client(self) -> Any:  # noqa: ANN401
+        """Secrets Manager client.
+
+        Returns:
+            Any: the client
+        """
+        import boto3
 
-        # Create a Secrets Manager client
         session = boto3.session.Session()
-        client = session.client(service_name="secretsmanager", region_name=region)
-        get_secret_value_response = client.get_secret_value(SecretId="pycaltime")
+        return session.client(
+            service_name="secretsmanager", region_name=self.AWS_REGION
+        )
 
-        return loads(get_secret_value_response["SecretString"]) | {"AWS_REGION": region}
+    def _load_secrets(self) -> dict[str, str]:
+        """Load secrets from AWS Secrets Manager.
+
+        Returns:
+            dict[str, str]: dictionary of secrets
+
+        Raises:
+            Exception: if the secrets can't be loaded, which are then loaded again on
+                next use
+        """
+        try:
+            get_secret_value_response = self.secrets_client.get_secret_value(
+                SecretId="pycaltime"
+            )
+            return loads(get_secret_value_response["SecretString"])
+        except Exception:
+            # forget the failure, so it isn't cached
+            with self._lock:
+                self._secrets = None
+            raise
 
 
 config = Config()
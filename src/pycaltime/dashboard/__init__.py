@@ -1,8 +1,65 @@
-"""Dashboard blueprint package."""
+"""Dashboard blueprint package.
+
+Views are imported on first use, so the API clients they depend on are only
+loaded when needed.
+"""
+
+from collections.abc import Callable
+from functools import cached_property
 
 from flask import Blueprint
+from flask.typing import ResponseReturnValue
+from werkzeug.utils import import_string
+
+from pycaltime.dashboard.conditional import add_cache_headers
 
 dashboard_blueprint = Blueprint("dashboard", __name__, template_folder="templates")
+dashboard_blueprint.after_request(add_cache_headers)
+
+
+class LazyView:
+    """A view function, imported on first use."""
+
+    def __init__(self, import_name: str) -> None:
+        """Initializer.
+
+        Args:
+            import_name (str): the dotted name of the view function
+        """
+        self.__module__, self.__name__ = import_name.rsplit(".", 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self) -> Callable[..., ResponseReturnValue]:
+        """The view function.
+
+        Returns:
+            Callable[..., ResponseReturnValue]: the view function
+        """
+        return import_string(self.import_name)
+
+    def __call__(self, *args: object, **kwargs: object) -> ResponseReturnValue:
+        """Call the view function.
+
+        Args:
+            *args (object): positional arguments for the view function
+            **kwargs (object): the URL variables
+
+        Returns:
+            ResponseReturnValue: the response
+        """
+        return self.view(*args, **kwargs)
+
 
-# import views to bind routes to blueprint
-from . import about, holiday, home, mileage, settings, timesheet  # noqa: E402, F401
+# bind routes to blueprint
+for rule, name in [
+    ("about", "about"),
+    ("/holiday", "holiday"),
+    ("home", "home"),
+    ("/mileage", "mileage"),
+    ("settings", "settings"),
+    ("/timesheet", "timesheet"),
+]:
+    dashboard_blueprint.add_url_rule(
+        rule, view_func=LazyView(f"pycaltime.dashboard.{name}.{name}")
+    )
@@ -8,10 +8,8 @@ from flask.typing import ResponseReturnValue
 from flask_dance.contrib.google import google
 
 from pycaltime import __version__
-from pycaltime.dashboard import dashboard_blueprint
 
 
-@dashboard_blueprint.route("about")
 def about() -> ResponseReturnValue:
     """Dashboard about."""
     if not google.authorized or google.token["expires_in"] < 0:
@@ -0,0 +1,60 @@
+"""Conditional GETs for dashboard pages.
+
+A page's ETag is derived from the version of the data it shows, the request and the
+templates, so a request whose If-None-Match matches is answered with 304 Not
+Modified before anything is fetched or rendered. Pages are private to the user, and
+revalidated on every use.
+"""
+
+from functools import cache
+from hashlib import sha256
+from pathlib import Path
+
+from flask import Response, g, request
+
+from pycaltime import __version__
+
+
+def set_page_version(*data_version: object) -> bool:
+    """Set the page's ETag from the version of the data it shows.
+
+    Args:
+        *data_version (object): the data version, with any values derived from the
+            current time, such as the current week
+
+    Returns:
+        bool: True if the client's copy of the page is current
+    """
+    key = (template_version(), request.full_path, *data_version)
+    g.etag = sha256(repr(key).encode()).hexdigest()
+    return request.if_none_match.contains(g.etag)
+
+
+def add_cache_headers(response: Response) -> Response:
+    """Add the ETag and Cache-Control headers to versioned pages.
+
+    Args:
+        response (Response): the response
+
+    Returns:
+        Response: the response, with the headers added
+    """
+    if "etag" in g and response.status_code in (200, 304):
+        response.set_etag(g.etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add("Cookie")
+    return response
+
+
+@cache
+def template_version() -> str:
+    """Version of the templates and package, so pages change when they do.
+
+    Returns:
+        str: the version
+    """
+    digest = sha256(__version__.encode())
+    for path in sorted(Path(__file__).parents[1].rglob("*.html")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
@@ -1,6 +1,7 @@
 """Milage view."""
 
 from datetime import UTC, date, datetime
+from http import HTTPStatus
 from itertools import groupby
 from re import match
 
@@ -9,15 +10,16 @@ from flask.typing import ResponseReturnValue
 from flask_dance.contrib.google import google
 
 from pycaltime.bank_holidays import bank_holidays
-from pycaltime.dashboard import dashboard_blueprint
+from pycaltime.calendar import user_timezone
+from pycaltime.dashboard.conditional import set_page_version
+from pycaltime.dashboard.user import load_user_data
 from pycaltime.google import (
-    get_user_info,
     iterate_events,
 )
-from pycaltime.storage import UserData
+from pycaltime.refresh import calendar_version
+from pycaltime.stages import timed
 
 
-@dashboard_blueprint.route("/holiday")
 def holiday() -> ResponseReturnValue:
     """Holiday view.
 
@@ -35,13 +37,32 @@ def holiday() -> ResponseReturnValue:
         year = datetime.now(UTC).date().year
 
     # load user data
-    user_id = get_user_info().id
-    user_data = list(UserData.query(user_id)).pop()
+    with timed("user"):
+        user_data = load_user_data()
+        timezone = user_timezone(user_data)
+    year_bank_holidays = bank_holidays(year)
+    if set_page_version(
+        year,
+        calendar_version(user_data),
+        user_data.settings_version(),
+        year_bank_holidays,
+    ):
+        return "", HTTPStatus.NOT_MODIFIED
     job_hashtags = {job.hashtag for job in user_data.jobs}
+
+    # list the events
+    with timed("events"):
+        events = list(
+            iterate_events(
+                date(year, 1, 1),
+                date(year + 1, 1, 1),
+                calendar_ids=user_data.calendars(),
+                calendar_timezone=timezone,
+                search=("holiday", "bank"),
+            )
+        )
     holiday_events = (
-        event
-        for event in iterate_events(date(year, 1, 1), date(year + 1, 1, 1))
-        if {"#holiday", "#bank"} & event.hashtags()
+        event for event in events if {"#holiday", "#bank"} & event.hashtags()
     )
 
     # create the table headers
@@ -79,7 +100,7 @@ def holiday() -> ResponseReturnValue:
 
     data.append({"date": "Total", "total": sum(col_totals.values())} | col_totals)
 
-    bank_holidays_this_year = len(bank_holidays(year))
+    bank_holidays_this_year = len(year_bank_holidays)
 
     # Calculate the remaining allowance
     data.append(
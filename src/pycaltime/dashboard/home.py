@@ -1,37 +1,53 @@
 """Dashboard home."""
 
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from functools import partial
 from zoneinfo import ZoneInfo
 
 from flask import redirect, render_template, url_for
 from flask.typing import ResponseReturnValue
 from flask_dance.contrib.google import google
 
-from pycaltime.calendar import update_timesheets
-from pycaltime.dashboard import dashboard_blueprint
-from pycaltime.google import get_calendar_timezone, get_user_info
-from pycaltime.storage import UserData
+from pycaltime.calendar import user_timezone
+from pycaltime.dashboard.user import load_user_data
+from pycaltime.google import get_user_info
+from pycaltime.refresh import load_view_timesheets, view_weeks
+from pycaltime.stages import run_stages, timed
 from pycaltime.utils import first_day_of_the_week
 
 
-@dashboard_blueprint.route("home")
 def home() -> ResponseReturnValue:
     """Dashboard home."""
     if not google.authorized or google.token["expires_in"] < 0:
         return redirect(url_for("google.login"))
 
     user_info = get_user_info()
-    user_data = list(UserData.query(user_info.id)).pop()
-    timezone = get_calendar_timezone()
-    current_week = first_day_of_the_week(datetime.now(tz=ZoneInfo(timezone)).date())
-
-    # update with this week's data
-    update_timesheets(current_week, current_week + timedelta(weeks=1), user_data)
-    user_data.save()
+    with timed("user"):
+        user_data = load_user_data()
+    current_week, start, finish = view_weeks(user_data)
+    refreshing = load_view_timesheets(start, finish, user_data)
+    updated = user_data.last_updated.astimezone(ZoneInfo(user_timezone(user_data)))
 
     worked = sum(job.timesheets[current_week].total() / 60 for job in user_data.jobs)
     contracted = sum(job.contracted_hours for job in user_data.jobs)
 
+    # worked and contracted hours this year, from the running totals
+    year_start = first_day_of_the_week(date(current_week.year, 1, 1))
+    next_week = current_week + timedelta(weeks=1)
+    totals = run_stages(
+        **{
+            f"totals{i}": partial(user_data.totals, job, year_start, next_week)
+            for i, job in enumerate(user_data.jobs)
+        }
+    )
+    year_to_date = {
+        job.hashtag: (
+            totals[f"totals{i}"].total() / 60,
+            job.contracted_minutes(year_start, next_week) / 60,
+        )
+        for i, job in enumerate(user_data.jobs)
+    }
+
     return render_template(
         "home.html",
         given_name=user_info.given_name,
@@ -39,4 +55,7 @@ def home() -> ResponseReturnValue:
         current_week=current_week,
         worked=worked,
         contracted=contracted,
+        year_to_date=year_to_date,
+        updated=updated,
+        refreshing=refreshing,
     )
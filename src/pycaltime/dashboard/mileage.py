@@ -1,19 +1,21 @@
 """Milage view."""
 
 from datetime import UTC, date, datetime
+from http import HTTPStatus
 from re import match
 
 from flask import redirect, render_template, request, url_for
 from flask.typing import ResponseReturnValue
 from flask_dance.contrib.google import google
 
-from pycaltime.dashboard import dashboard_blueprint
+from pycaltime.calendar import user_timezone
+from pycaltime.dashboard.conditional import set_page_version
+from pycaltime.dashboard.user import load_user_data
 from pycaltime.google import (
     get_distances,
-    get_user_info,
     iterate_events,
 )
-from pycaltime.storage import UserData
+from pycaltime.refresh import calendar_version
 from pycaltime.utils import (
     first_day_of_the_month,
     first_day_of_the_next_month,
@@ -21,7 +23,6 @@ from pycaltime.utils import (
 )
 
 
-@dashboard_blueprint.route("/mileage")
 def mileage() -> ResponseReturnValue:
     """Mileage. view.
 
@@ -33,8 +34,7 @@ def mileage() -> ResponseReturnValue:
         return redirect(url_for("google.login"))
 
     # load user data
-    user_id = get_user_info().id
-    user_data = list(UserData.query(user_id)).pop()
+    user_data = load_user_data()
 
     # handle the month parameter
     if "month" in request.args and match(r"\d{4}-\d{2}-\d{2}", request.args["month"]):
@@ -54,10 +54,21 @@ def mileage() -> ResponseReturnValue:
         job_filter = 0
         hashtags = {job.hashtag for job in user_data.jobs if job.hashtag}
 
+    if set_page_version(
+        month, job_filter, calendar_version(user_data), user_data.settings_version()
+    ):
+        return "", HTTPStatus.NOT_MODIFIED
+
     # get the events for the month, and calculate distances
     location_events = [
         event
-        for event in iterate_events(month, first_day_of_the_next_month(month))
+        for event in iterate_events(
+            month,
+            first_day_of_the_next_month(month),
+            calendar_ids=user_data.calendars(),
+            calendar_timezone=user_timezone(user_data),
+            search=tuple(sorted(hashtag.lstrip("#") for hashtag in hashtags)),
+        )
         if event.location and event.hashtags() & hashtags
     ]
     origin = "217 St Leonards Road, Horsham, RH13 6BE"
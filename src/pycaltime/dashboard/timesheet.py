@@ -1,20 +1,26 @@
 """Timesheet blueprint."""
 
-from datetime import datetime, timedelta
+from datetime import timedelta
+from http import HTTPStatus
 from zoneinfo import ZoneInfo
 
 from flask import redirect, render_template, url_for
 from flask.typing import ResponseReturnValue
 from flask_dance.contrib.google import google
 
-from pycaltime.calendar import first_day_of_the_week, update_timesheets
-from pycaltime.dashboard import dashboard_blueprint
-from pycaltime.google import get_calendar_timezone, get_user_info
-from pycaltime.storage import UserData
+from pycaltime.calendar import user_timezone
+from pycaltime.dashboard.conditional import set_page_version
+from pycaltime.dashboard.user import load_user_data
+from pycaltime.refresh import (
+    load_view_timesheets,
+    needs_refresh,
+    request_refresh,
+    view_weeks,
+)
+from pycaltime.stages import timed
 from pycaltime.utils import date_range
 
 
-@dashboard_blueprint.route("/timesheet")
 def timesheet() -> ResponseReturnValue:
     """Timesheet.
 
@@ -24,18 +30,24 @@ def timesheet() -> ResponseReturnValue:
     if not google.authorized or google.token["expires_in"] < 0:
         return redirect(url_for("google.login"))
 
-    user_id = get_user_info().id
-    timezone = get_calendar_timezone()
-    current_week = first_day_of_the_week(datetime.now(tz=ZoneInfo(timezone)).date())
-    user_data = list(UserData.query(user_id)).pop()
+    with timed("user"):
+        user_data = load_user_data()
+    current_week, start, finish = view_weeks(user_data)
 
-    # update with recent calendar data
-    update_timesheets(
-        current_week - timedelta(weeks=user_data.view_past_weeks),
-        current_week + timedelta(weeks=user_data.view_future_weeks + 1),
-        user_data,
-    )
-    user_data.save()
+    # the client's copy is current if the timesheets haven't been synced since, and
+    # stale timesheets can be refreshed after the response, with the refresh token
+    stale = needs_refresh(user_data)
+    if not (stale and user_data.refresh_token is None) and set_page_version(
+        current_week, user_data.last_updated, user_data.settings_version()
+    ):
+        if stale:
+            request_refresh(user_data)
+        return "", HTTPStatus.NOT_MODIFIED
+
+    # versioned after loading, which may migrate the jobs or sync the timesheets
+    refreshing = load_view_timesheets(start, finish, user_data)
+    set_page_version(current_week, user_data.last_updated, user_data.settings_version())
+    updated = user_data.last_updated.astimezone(ZoneInfo(user_timezone(user_data)))
 
     # create the table headers
     titles = [("date", "Date")]
@@ -47,11 +59,7 @@ def timesheet() -> ResponseReturnValue:
 
     # create the table data
     data = []
-    weeks = date_range(
-        current_week - timedelta(weeks=user_data.view_past_weeks),
-        current_week + timedelta(weeks=user_data.view_future_weeks + 1),
-        timedelta(weeks=1),
-    )
+    weeks = date_range(start, finish, timedelta(weeks=1))
     for week in weeks:
         row = {"date": week.strftime("%d-%m-%Y")}
         weekly_total = 0
@@ -72,4 +80,6 @@ def timesheet() -> ResponseReturnValue:
         titles=titles,
         primary_key="date",
         highlight=current_week.strftime("%d-%m-%Y"),
+        updated=updated,
+        refreshing=refreshing,
     )
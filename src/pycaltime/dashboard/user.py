@@ -0,0 +1,25 @@
+"""Dashboard user."""
+
+from flask import g
+from flask_dance.contrib.google import google
+
+from pycaltime.google import get_user_info
+from pycaltime.storage import UserData
+
+
+def load_user_data() -> UserData:
+    """Load the signed in user's UserData, once per request.
+
+    The user's offline refresh token is stored for the scheduled sync, whenever
+    Google issues a new one.
+
+    Returns:
+        UserData: the user
+    """
+    if "user_data" not in g:
+        g.user_data = UserData.get(get_user_info().id)
+        refresh_token = google.token.get("refresh_token")
+        if refresh_token and refresh_token != g.user_data.refresh_token:
+            g.user_data.refresh_token = refresh_token
+            g.user_data.save()
+    return g.user_data
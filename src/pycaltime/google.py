@@ -1,20 +1,36 @@
 """Google API Interface."""
 
-from collections.abc import Iterable, Iterator
-from dataclasses import dataclass
-from datetime import date, datetime, timedelta
-from itertools import batched
-from re import findall
-from typing import Any
+import re
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from functools import cache
+from heapq import merge
+from http import HTTPStatus
+from itertools import islice
+from operator import attrgetter
+from random import uniform
+from sys import intern
+from threading import Condition, Lock
+from time import sleep, time
+from typing import TYPE_CHECKING, Any, TypeVar
 from zoneinfo import ZoneInfo
 
-import googleapiclient.discovery
-import googlemaps
+from flask import g, has_request_context, session
 from flask_dance.contrib.google import google
-from google.oauth2 import credentials
 
 from pycaltime.config import config
-from pycaltime.utils import include_from_dict
+from pycaltime.utils import date_range, include_from_dict
+
+# the Google API clients are slow to import, so are imported on first use
+if TYPE_CHECKING:
+    import googlemaps
+    from googleapiclient.errors import HttpError
+
+_T = TypeVar("_T")
 
 
 @include_from_dict
@@ -30,15 +46,44 @@ class UserInfo:
     verified_email: bool
 
 
-@dataclass
+# Hashtags in event titles and descriptions
+HASHTAG_PATTERN = re.compile(r"#\w+")
+
+# Timesheet categories of the leave hashtags, in order of precedence, with work as
+# the default
+LEAVE_CATEGORIES = {"#holiday": "holiday", "#bank": "bank", "#sick": "sick"}
+
+
+@dataclass(slots=True)
 class CalendarEvent:
-    """Calendar Event."""
+    """Calendar Event.
+
+    The uid is the iCalendar UID, shared by copies of the event in other calendars.
+    The hashtags, category and duration are decoded once, on first use, and decoded
+    again if the event is changed.
+    """
 
     title: str
     description: str
     location: str
     start: datetime
     finish: datetime
+    id: str = ""
+    uid: str = ""
+    _decoded: tuple[frozenset[str], str, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name: str, value: object) -> None:
+        """Set an attribute, clearing the decoded values.
+
+        Args:
+            name (str): the attribute name
+            value (object): the value
+        """
+        object.__setattr__(self, name, value)
+        if name != "_decoded":
+            object.__setattr__(self, "_decoded", None)
 
     def duration(self) -> int:
         """Event duration, in minutes.
@@ -46,7 +91,7 @@ class CalendarEvent:
         Returns:
             int: minutes
         """
-        return (self.finish - self.start) // timedelta(minutes=1)
+        return self._decode()[2]
 
     def hashtags(self) -> frozenset[str]:
         """Retrieve hashtags from the event.
@@ -54,9 +99,35 @@ class CalendarEvent:
         Returns:
             frozenset[str]: hashtags
         """
-        return frozenset(
-            findall(r"#\w+", f"{self.title.lower()} {self.description.lower()}")
-        )
+        return self._decode()[0]
+
+    def category(self) -> str:
+        """Timesheet category of the event, from the leave hashtags.
+
+        Returns:
+            str: the category, such as work or holiday
+        """
+        return self._decode()[1]
+
+    def _decode(self) -> tuple[frozenset[str], str, int]:
+        """Decode the hashtags, category and duration, unless already decoded.
+
+        Returns:
+            tuple[frozenset[str], str, int]: the hashtags, category and duration
+        """
+        if self._decoded is None:
+            hashtags = frozenset(
+                intern(x)
+                for x in HASHTAG_PATTERN.findall(
+                    f"{self.title.lower()} {self.description.lower()}"
+                )
+            )
+            category = next(
+                (v for k, v in LEAVE_CATEGORIES.items() if k in hashtags), "work"
+            )
+            duration = (self.finish - self.start) // timedelta(minutes=1)
+            self._decoded = (hashtags, category, duration)
+        return self._decoded
 
     def distance(self, origin: str) -> int:
         """Calculate distance from an origin address.
@@ -67,49 +138,156 @@ class CalendarEvent:
         Returns:
             int: the distance, in meters
         """
-        maps_client = googlemaps.Client(key=config.GOOGLE_MAPS_API_KEY)
-        matrix = maps_client.distance_matrix(
-            origins=[origin],
-            destinations=[self.location],
-            arrival_time=self.start,
-            mode="driving",
+        return get_distances(origin, [self])[0]
+
+
+# How long calendar metadata (list and timezones) is cached for
+CALENDAR_METADATA_TTL = timedelta(hours=12)
+
+# Long event listings are split into windows of this length, and fetched
+# concurrently by up to FETCH_WORKERS threads
+FETCH_WINDOW = timedelta(weeks=8)
+FETCH_WORKERS = 4
+
+# Windows listed ahead of the events being read, which are held in memory
+FETCH_AHEAD = 2 * FETCH_WORKERS
+
+# Event listings request the largest pages, and only the fields that are used
+MAX_RESULTS = 2500
+EVENT_FIELDS = (
+    "items(id,iCalUID,summary,description,location,start/dateTime,end/dateTime),"
+    "nextPageToken"
+)
+SYNC_FIELDS = (
+    "items(id,iCalUID,status,summary,description,location,start/dateTime,"
+    "end/dateTime),nextPageToken,nextSyncToken"
+)
+
+# Rate limited requests are retried up to FETCH_RETRIES times, with the delay
+# doubling from FETCH_BACKOFF
+FETCH_RETRIES = 5
+FETCH_BACKOFF = timedelta(seconds=1)
+
+# Reasons for 403 Forbidden responses that mean the request was rate limited
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+# How long driving distances are cached for
+DISTANCE_CACHE_TTL = timedelta(days=90)
+
+# Number of driving distances cached in memory
+DISTANCE_CACHE_SIZE = 1024
+
+# Module level caches, which outlive a request, so warm Lambda invocations reuse
+# them.
+
+# Driving distances, by origin and destination, with the expiry time, saving a
+# DynamoDB read for routes driven again.
+_distances: OrderedDict[tuple[str, str], tuple[int, float]] = OrderedDict()
+
+# Calendar API services, by access token, with the token expiry time, as building
+# a service loads its discovery document.
+_services: dict[str, tuple[Any, float]] = {}
+_services_lock = Lock()
+
+
+def api_service() -> Any:  # noqa: ANN401
+    """Calendar API service for the current access token.
+
+    Services are cached by access token, and evicted when the token expires. The
+    cache is shared by the scheduled sync's worker threads, so is guarded by a lock.
+
+    Returns:
+        Any: the Calendar API service
+    """
+    access_token = google.access_token
+    now = time()
+    with _services_lock:
+        # evict services with expired tokens
+        for k in [k for k, (_, expiry) in _services.items() if expiry <= now]:
+            del _services[k]
+        cached = _services.get(access_token)
+
+    # services are built outside the lock, as building one takes a while
+    if cached is None:
+        import googleapiclient.discovery
+        from google.oauth2 import credentials
+
+        creds = credentials.Credentials(
+            access_token,
+            client_id=config.GOOGLE_CLIENT_ID,
+            client_secret=config.GOOGLE_CLIENT_SECRET,
+            scopes=["https://www.googleapis.com/auth/calendar.readonly"],
         )
-        if not (
-            matrix["status"] == "OK"
-            and matrix["rows"][0]["elements"][0]["status"] == "OK"
-        ):
-            return 0
-        return matrix["rows"][0]["elements"][0]["distance"]["value"]
-
-
-def api_service() -> None:
-    """API service."""
-    creds = credentials.Credentials(
-        google.access_token,
-        client_id=config.GOOGLE_CLIENT_ID,
-        client_secret=config.GOOGLE_CLIENT_SECRET,
-        scopes=["https://www.googleapis.com/auth/calendar.readonly"],
-    )
 
-    # Build the Calendar API service.
-    return googleapiclient.discovery.build("calendar", "v3", credentials=creds)
+        # Build the Calendar API service.
+        service = googleapiclient.discovery.build("calendar", "v3", credentials=creds)
+        expiry = google.token.get("expires_at", now + google.token["expires_in"])
+        cached = (service, expiry)
+        with _services_lock:
+            _services[access_token] = cached
+
+    return cached[0]
+
+
+@dataclass
+class EventChanges:
+    """Events listed by a calendar sync."""
+
+    events: list[CalendarEvent]
+    cancelled: list[str]
+    sync_token: str
+
+
+class SyncTokenExpiredError(Exception):
+    """The sync token has been invalidated, and a full sync is required."""
 
 
 def get_user_info() -> UserInfo:
-    """User Information."""
-    resp = google.get("/oauth2/v2/userinfo")
-    data = resp.json()
-    return UserInfo.from_dict(data)
+    """User Information.
+
+    The profile is cached in the session until the next login, and in flask.g for
+    the rest of the request.
+
+    Returns:
+        UserInfo: the signed in user
+    """
+    if "user_info" not in g:
+        if "user_info" not in session:
+            session["user_info"] = google.get("/oauth2/v2/userinfo").json()
+        g.user_info = UserInfo.from_dict(session["user_info"])
+    return g.user_info
+
+
+def invalidate_user_info() -> None:
+    """Remove the cached user information from the session."""
+    session.pop("user_info", None)
+    g.pop("user_info", None)
 
 
 def get_calendar_list() -> list[Any]:
     """Retrieves a list of calendars for the authenticated user.
 
+    The list is cached in the session for CALENDAR_METADATA_TTL, keeping only the
+    id, summary, timeZone and primary fields of each calendar.
+
     Returns:
         list[Any]: calendar list
     """
-    calendar_list = api_service().calendarList().list().execute()
-    return calendar_list.get("items", [])
+    # refreshes outside a request have no session to cache in
+    store = session if has_request_context() else {}
+    cached = store.get("calendar_list")
+    if cached and time() - cached["fetched"] < CALENDAR_METADATA_TTL.total_seconds():
+        return cached["items"]
+
+    calendar_list = (
+        api_service()
+        .calendarList()
+        .list(fields="items(id,summary,timeZone,primary)")
+        .execute()
+    )
+    items = calendar_list.get("items", [])
+    store["calendar_list"] = {"fetched": time(), "items": items}
+    return items
 
 
 def get_calendar_timezone(calendar_id: str = "primary") -> str:
@@ -121,102 +299,579 @@ def get_calendar_timezone(calendar_id: str = "primary") -> str:
     Returns:
         str: the timezone string
     """
-    calendar_list = api_service().calendarList().list().execute()
     return next(
         calendar.get("timeZone")
-        for calendar in calendar_list.get("items", [])
-        if calendar.get(calendar_id, False)
+        for calendar in get_calendar_list()
+        if calendar.get(calendar_id, False) or calendar.get("id") == calendar_id
     )
 
 
+def invalidate_calendar_metadata() -> None:
+    """Remove the cached calendar metadata from the session."""
+    session.pop("calendar_list", None)
+
+
 def iterate_events(
-    start: date, finish: date, calendar_id: str = "primary"
+    start: date,
+    finish: date,
+    calendar_ids: Sequence[str] = ("primary",),
+    calendar_timezone: str | None = None,
+    search: tuple[str, ...] = (),
 ) -> Iterator[CalendarEvent]:
     """Iterator calendar events from the API.
 
+    Long periods are split into windows of FETCH_WINDOW, with each event listed in
+    the window it starts in. The windows of each calendar are fetched concurrently,
+    up to FETCH_AHEAD windows ahead of the events yielded, and merged by
+    merge_events.
+
     Args:
         start (date): start date
         finish (date): end date
-        calendar_id (str, optional): calendar id. Defaults to "primary".
+        calendar_ids (Sequence[str], optional): calendar ids. Defaults to
+            ("primary",).
+        calendar_timezone (str | None, optional): the timezone of the first
+            calendar, looked up when None. Defaults to None.
+        search (tuple[str, ...], optional): only list events matching any of these
+            free text search terms, as a server side pre-filter. Defaults to ().
+
+    Yields:
+        CalendarEvent: the events, in start order
+    """
+    if calendar_timezone is None:
+        calendar_timezone = get_calendar_timezone(calendar_ids[0])
+    tzinfo = ZoneInfo(calendar_timezone)
+    windows = [
+        (
+            datetime.combine(day, datetime.min.time(), tzinfo),
+            datetime.combine(
+                min(day + FETCH_WINDOW, finish), datetime.min.time(), tzinfo
+            ),
+        )
+        for day in date_range(start, finish, FETCH_WINDOW)
+    ]
+    lists = [(x, q) for x in calendar_ids for q in search or (None,)]
+    tasks = [(x, window, q) for window in windows for x, q in lists]
+
+    service = api_service()
+    if len(tasks) <= 1:
+        results = (_list_window(service, *task) for task in tasks)
+        yield from _merge_windows(windows, len(lists), results)
+        return
+
+    # fetch the windows concurrently, only a few ahead of the events yielded
+    limiter = _ConcurrencyLimiter(FETCH_WORKERS)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        results = _fetch_ahead(
+            executor,
+            lambda task: _list_window(service, *task, limiter=limiter, own_http=True),
+            tasks,
+            FETCH_AHEAD,
+        )
+        yield from _merge_windows(windows, len(lists), results)
+
+
+def _fetch_ahead(
+    executor: ThreadPoolExecutor,
+    fetch: Callable[[_T], list[CalendarEvent]],
+    tasks: Iterable[_T],
+    ahead: int,
+) -> Iterator[list[CalendarEvent]]:
+    """Run fetches on an executor, keeping a limited number ahead of the results.
+
+    Unlike Executor.map, which starts every fetch at once, only the results of the
+    fetches ahead are held in memory.
+
+    Args:
+        executor (ThreadPoolExecutor): the executor
+        fetch (Callable[[_T], list[CalendarEvent]]): the fetch
+        tasks (Iterable[_T]): the arguments of each fetch
+        ahead (int): the number of fetches to run ahead of the results
+
+    Yields:
+        list[CalendarEvent]: the result of each fetch, in order
+    """
+    tasks = iter(tasks)
+    futures = deque(executor.submit(fetch, task) for task in islice(tasks, ahead))
+    try:
+        while futures:
+            result = futures.popleft().result()
+            futures.extend(executor.submit(fetch, task) for task in islice(tasks, 1))
+            yield result
+    finally:
+        # fetches not yet started are abandoned if the events aren't all read
+        for future in futures:
+            future.cancel()
+
+
+def merge_events(*events: Iterable[CalendarEvent]) -> Iterator[CalendarEvent]:
+    """Merge streams of events, each sorted by start, in start order.
+
+    Events listed in more than one stream, such as an event in several calendars,
+    are only yielded once, matching them by uid and start. Only the events with the
+    current start are remembered, as copies of an event start together.
+
+    Args:
+        *events (Iterable[CalendarEvent]): the streams of events
 
     Yields:
-        CalendarEvent: the events
-    """
-    calendar_timezone = get_calendar_timezone()
-    time_start = datetime(
-        year=start.year,
-        month=start.month,
-        day=start.day,
-        tzinfo=ZoneInfo(calendar_timezone),
-    ).isoformat()
-    time_finish = datetime(
-        year=finish.year,
-        month=finish.month,
-        day=finish.day,
-        tzinfo=ZoneInfo(calendar_timezone),
-    ).isoformat()
-
-    # Call the Calendar API to get events
+        CalendarEvent: the events, without duplicates
+    """
+    listed = set()
+    current = None
+    for event in merge(*events, key=attrgetter("start")):
+        if event.start != current:
+            listed.clear()
+            current = event.start
+        key = event.uid or event.id
+        if key not in listed:
+            listed.add(key)
+            yield event
+
+
+def _merge_windows(
+    windows: list[tuple[datetime, datetime]],
+    lists: int,
+    results: Iterator[list[CalendarEvent]],
+) -> Iterator[CalendarEvent]:
+    """Merge the events listed for each window, in start order.
+
+    Args:
+        windows (list[tuple[datetime, datetime]]): the windows
+        lists (int): the number of lists in each window, one for each calendar and
+            search
+        results (Iterator[list[CalendarEvent]]): the events of each list, in order
+
+    Yields:
+        CalendarEvent: the events, without duplicates
+    """
+    for i, (window_start, _) in enumerate(windows):
+        yield from (
+            event
+            for event in merge_events(*(next(results) for _ in range(lists)))
+            if i == 0 or event.start >= window_start
+        )
+
+
+def _list_window(
+    service: Any,  # noqa: ANN401
+    calendar_id: str,
+    window: tuple[datetime, datetime],
+    search: str | None,
+    limiter: "_ConcurrencyLimiter | None" = None,
+    own_http: bool = False,
+) -> list[CalendarEvent]:
+    """List the events in a window, excluding all day events.
+
+    Args:
+        service (Any): the Calendar API service
+        calendar_id (str): calendar id
+        window (tuple[datetime, datetime]): the start and end of the window
+        search (str | None): free text search terms, if any
+        limiter (_ConcurrencyLimiter | None, optional): the concurrency limiter
+            shared by the windows. Defaults to None.
+        own_http (bool, optional): use a new http connection, for worker threads.
+            Defaults to False.
+
+    Returns:
+        list[CalendarEvent]: the events, in start order
+    """
+    events = []
+    http = None
     next_page_token = None
     while True:
-        events_result = (
-            api_service()
-            .events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=time_start,
-                timeMax=time_finish,
-                singleEvents=True,
-                orderBy="startTime",
-                pageToken=next_page_token,
-            )
-            .execute()
+        request = service.events().list(
+            calendarId=calendar_id,
+            timeMin=window[0].isoformat(),
+            timeMax=window[1].isoformat(),
+            singleEvents=True,
+            orderBy="startTime",
+            maxResults=MAX_RESULTS,
+            fields=EVENT_FIELDS,
+            pageToken=next_page_token,
+            **({"q": search} if search else {}),
         )
+        if own_http and http is None:
+            http = _new_http(request)
+        events_result = _execute(request, http, limiter)
 
-        yield from (
-            CalendarEvent(
-                title=x.get("summary", ""),
-                description=x.get("description", ""),
-                location=x.get("location", ""),
-                start=datetime.fromisoformat(x.get("start").get("dateTime")),
-                finish=datetime.fromisoformat(x.get("end").get("dateTime")),
-            )
+        events.extend(
+            _calendar_event(x)
             for x in events_result.get("items", [])
-            if x.get("start").get("dateTime") is not None  # ignore all day events
+            if x.get("start", {}).get("dateTime") is not None  # ignore all day events
         )
 
         # handle paging
         next_page_token = events_result.get("nextPageToken")
         if not next_page_token:
-            break  # Exit loop if there are no more pages
+            return events
 
 
-def get_distances(origin: str, events: Iterable[CalendarEvent]) -> Iterable[int]:
-    """Get distances to each event, starting from origin.
+class _ConcurrencyLimiter:
+    """Limits concurrent API requests, halving the limit when rate limited.
+
+    The limit is raised by one after each successful request, back up to the
+    maximum.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        """Initializer.
+
+        Args:
+            maximum (int): the maximum number of concurrent requests
+        """
+        self.maximum = maximum
+        self.limit = maximum
+        self.active = 0
+        self._condition = Condition()
+
+    def __enter__(self) -> None:
+        """Wait for a request slot."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    def __exit__(self, *args: object) -> None:
+        """Release the request slot."""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def succeeded(self) -> None:
+        """Raise the limit after a successful request."""
+        with self._condition:
+            self.limit = min(self.limit + 1, self.maximum)
+            self._condition.notify_all()
+
+    def rate_limited(self) -> None:
+        """Halve the limit after a rate limited request."""
+        with self._condition:
+            self.limit = max(self.limit // 2, 1)
+
+
+def _execute(
+    request: Any,  # noqa: ANN401
+    http: Any = None,  # noqa: ANN401
+    limiter: _ConcurrencyLimiter | None = None,
+) -> dict[str, Any]:
+    """Execute an API request, with exponential backoff when rate limited.
+
+    Args:
+        request (Any): the API request
+        http (Any, optional): the http connection, or None for the service's own.
+            Defaults to None.
+        limiter (_ConcurrencyLimiter | None, optional): the concurrency limiter.
+            Defaults to None.
+
+    Returns:
+        dict[str, Any]: the response
+
+    Raises:
+        HttpError: if the request fails, other than by rate limiting, or is still
+            rate limited after FETCH_RETRIES attempts
+    """
+    from googleapiclient.errors import HttpError
+
+    attempt = 0
+    while True:
+        try:
+            with limiter or nullcontext():
+                response = request.execute(http=http)
+        except HttpError as e:  # noqa: PERF203
+            attempt += 1
+            if not _is_rate_limited(e) or attempt >= FETCH_RETRIES:
+                raise
+            if limiter is not None:
+                limiter.rate_limited()
+            delay = FETCH_BACKOFF.total_seconds() * 2 ** (attempt - 1)
+            sleep(delay * uniform(0.5, 1.0))  # noqa: S311
+        else:
+            if limiter is not None:
+                limiter.succeeded()
+            return response
+
+
+def _is_rate_limited(error: "HttpError") -> bool:
+    """Check if a request failed due to rate limiting.
+
+    Args:
+        error (HttpError): the error
+
+    Returns:
+        bool: True if rate limited
+    """
+    return error.resp.status == HTTPStatus.TOO_MANY_REQUESTS or (
+        error.resp.status == HTTPStatus.FORBIDDEN
+        and any(reason in error.content for reason in RATE_LIMIT_REASONS)
+    )
+
+
+def _new_http(request: Any) -> Any:  # noqa: ANN401
+    """Create a new http connection, with the credentials of a request.
+
+    The service's http connection is not thread safe, so each worker thread needs
+    its own.
 
     Args:
-        origin (str): _description_
-        events (Iterable[CalendarEvent]): _description_
+        request (Any): the API request
 
     Returns:
-        Iterable[int]: _description_
+        Any: the authorized http connection
     """
-    maps_client = googlemaps.Client(key=config.GOOGLE_MAPS_API_KEY)
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
 
-    results = []
-    for batch in batched(events, 25):
-        matrix = maps_client.distance_matrix(
-            origins=[origin],
-            destinations=[event.location for event in batch],
-            mode="driving",
+    return AuthorizedHttp(request.http.credentials, http=build_http())
+
+
+def sync_events(
+    sync_token: str | None,
+    start: date,
+    calendar_id: str = "primary",
+    calendar_timezone: str | None = None,
+) -> EventChanges:
+    """Synchronise calendar events from the API.
+
+    Without a sync token, every event from start onwards is listed (a full sync).
+    With a sync token, only the events changed since the token was issued are
+    listed (an incremental sync). All day events are reported as cancelled, as they
+    are not included in timesheets.
+
+    Args:
+        sync_token (str | None): token from the previous sync, or None
+        start (date): start date for a full sync
+        calendar_id (str, optional): calendar id. Defaults to "primary".
+        calendar_timezone (str | None, optional): the calendar's timezone, looked
+            up when None. Defaults to None.
+
+    Raises:
+        SyncTokenExpiredError: if the sync token is no longer valid
+        HttpError: if the request fails for any other reason
+
+    Returns:
+        EventChanges: the changed events, sorted by start, and the next sync token
+    """
+    if sync_token is None:
+        if calendar_timezone is None:
+            calendar_timezone = get_calendar_timezone(calendar_id)
+        query = {
+            "timeMin": datetime(
+                year=start.year,
+                month=start.month,
+                day=start.day,
+                tzinfo=ZoneInfo(calendar_timezone),
+            ).isoformat()
+        }
+    else:
+        query = {"syncToken": sync_token}
+
+    from googleapiclient.errors import HttpError
+
+    service = api_service()
+    changes = EventChanges(events=[], cancelled=[], sync_token="")
+    next_page_token = None
+    while True:
+        try:
+            events_result = _execute(
+                service.events().list(
+                    calendarId=calendar_id,
+                    singleEvents=True,
+                    showDeleted=sync_token is not None,
+                    maxResults=MAX_RESULTS,
+                    fields=SYNC_FIELDS,
+                    pageToken=next_page_token,
+                    **query,
+                )
+            )
+        except HttpError as e:
+            if e.resp.status == HTTPStatus.GONE:
+                raise SyncTokenExpiredError from e
+            raise
+
+        for x in events_result.get("items", []):
+            if x.get("status") == "cancelled" or "dateTime" not in x.get("start", {}):
+                changes.cancelled.append(x["id"])
+            else:
+                changes.events.append(_calendar_event(x))
+
+        # handle paging
+        next_page_token = events_result.get("nextPageToken")
+        if not next_page_token:
+            changes.sync_token = events_result.get("nextSyncToken", "")
+            break
+
+    changes.events.sort(key=lambda x: x.start)
+    return changes
+
+
+def _calendar_event(item: dict[str, Any]) -> CalendarEvent:
+    """Create a CalendarEvent from an API event resource.
+
+    Args:
+        item (dict[str, Any]): the event resource
+
+    Returns:
+        CalendarEvent: the event
+    """
+    return CalendarEvent(
+        title=item.get("summary", ""),
+        description=item.get("description", ""),
+        location=item.get("location", ""),
+        start=datetime.fromisoformat(item.get("start").get("dateTime")),
+        finish=datetime.fromisoformat(item.get("end").get("dateTime")),
+        id=item.get("id", ""),
+        uid=item.get("iCalUID", ""),
+    )
+
+
+def watch_events(
+    calendar_id: str, channel_id: str, address: str, token: str, ttl: timedelta
+) -> dict[str, Any]:
+    """Open a notification channel for changes to a calendar's events.
+
+    Args:
+        calendar_id (str): calendar id
+        channel_id (str): a new, unique, channel id
+        address (str): the https address notifications are posted to
+        token (str): sent with every notification, to verify it
+        ttl (timedelta): how long the channel should stay open
+
+    Returns:
+        dict[str, Any]: the channel, with its resourceId and expiration in
+            milliseconds since the epoch
+    """
+    return _execute(
+        api_service()
+        .events()
+        .watch(
+            calendarId=calendar_id,
+            body={
+                "id": channel_id,
+                "type": "web_hook",
+                "address": address,
+                "token": token,
+                "params": {"ttl": str(int(ttl.total_seconds()))},
+            },
         )
-        if matrix["status"] != "OK":
-            results.extend([0] * len(batch))
-
-        results.extend(
-            [
-                x["distance"]["value"] if x["status"] == "OK" else 0
-                for x in matrix["rows"][0]["elements"]
-            ]
+    )
+
+
+def stop_channel(channel_id: str, resource_id: str) -> None:
+    """Close a notification channel, if it is still open.
+
+    Args:
+        channel_id (str): the channel id
+        resource_id (str): the channel's resource id
+
+    Raises:
+        HttpError: if the request fails, other than for a channel that is already
+            closed
+    """
+    from googleapiclient.errors import HttpError
+
+    try:
+        _execute(
+            api_service()
+            .channels()
+            .stop(body={"id": channel_id, "resourceId": resource_id})
         )
-    return results
+    except HttpError as e:
+        if e.resp.status != HTTPStatus.NOT_FOUND:
+            raise
+
+
+@cache
+def maps_client() -> "googlemaps.Client":
+    """Google Maps client, shared by all requests.
+
+    Returns:
+        googlemaps.Client: the client
+    """
+    import googlemaps
+
+    return googlemaps.Client(key=config.GOOGLE_MAPS_API_KEY)
+
+
+def get_distances(
+    origin: str,
+    events: Iterable[CalendarEvent],
+    ttl: timedelta = DISTANCE_CACHE_TTL,
+) -> list[int]:
+    """Get distances to each event, starting from origin.
+
+    Distances are cached in memory and in the Distance table. Only unique
+    destinations missing from both caches are sent to the Distance Matrix API.
+
+    Args:
+        origin (str): the start location
+        events (Iterable[CalendarEvent]): the events
+        ttl (timedelta, optional): how long new distances are cached for. Defaults
+            to DISTANCE_CACHE_TTL.
+
+    Returns:
+        list[int]: the distance to each event, in meters, or 0 if unknown
+    """
+    from pycaltime.storage import Distance
+
+    events = list(events)
+    now = datetime.now(UTC)
+    results: dict[str, int] = {}
+
+    # check the memory cache
+    for destination in {event.location for event in events}:
+        meters, expiry = _distances.get((origin, destination), (0, 0.0))
+        if expiry > now.timestamp():
+            _distances.move_to_end((origin, destination))
+            results[destination] = meters
+
+    # check the database cache
+    missing = [x for x in {event.location for event in events} if x not in results]
+    for item in Distance.batch_get([(origin, x) for x in missing]):
+        if item.expires > now:
+            results[item.destination] = item.meters
+            _cache_distance(origin, item.destination, item.meters, item.expires)
+
+    # lookup the remaining destinations
+    remaining = iter(x for x in missing if x not in results)
+    expires = now + ttl
+    with Distance.batch_write() as batch:
+        while destinations := list(islice(remaining, 25)):
+            matrix = maps_client().distance_matrix(
+                origins=[origin],
+                destinations=destinations,
+                mode="driving",
+            )
+            if matrix["status"] != "OK":
+                continue
+
+            for destination, x in zip(destinations, matrix["rows"][0]["elements"]):
+                meters = x["distance"]["value"] if x["status"] == "OK" else 0
+                results[destination] = meters
+                _cache_distance(origin, destination, meters, expires)
+                batch.save(
+                    Distance(
+                        origin=origin,
+                        destination=destination,
+                        meters=meters,
+                        expires=expires,
+                    )
+                )
+
+    return [results.get(event.location, 0) for event in events]
+
+
+def _cache_distance(
+    origin: str, destination: str, meters: int, expires: datetime
+) -> None:
+    """Add a distance to the memory cache, evicting the least recently used.
+
+    Args:
+        origin (str): the start location
+        destination (str): the destination
+        meters (int): the distance, in meters
+        expires (datetime): when the distance expires
+    """
+    _distances[(origin, destination)] = (meters, expires.timestamp())
+    _distances.move_to_end((origin, destination))
+    while len(_distances) > DISTANCE_CACHE_SIZE:
+        _distances.popitem(last=False)
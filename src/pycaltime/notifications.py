@@ -0,0 +1,151 @@
+"""Calendar push notifications.
+
+Each user's calendars are watched with Calendar API notification channels, which
+post to the webhook whenever their events change. The webhook marks the user's
+calendar as changed, and the next view or scheduled sync refreshes the timesheets
+with an incremental sync. Until then, watched timesheets are up to date without
+polling Google. Channels are renewed by the sync before they expire.
+
+Calendars are only watched when config.NOTIFICATION_URL is set, as Google only posts
+notifications to a public https address.
+"""
+
+import logging
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from flask import abort, current_app, request
+from flask.typing import ResponseReturnValue
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from pycaltime.config import config
+from pycaltime.google import stop_channel, watch_events
+from pycaltime.storage import UserData
+
+# How long channels are opened for, and renewed before
+CHANNEL_TTL = timedelta(days=7)
+CHANNEL_RENEWAL = timedelta(days=1)
+
+logger = logging.getLogger(__name__)
+
+
+def calendar_notification() -> ResponseReturnValue:
+    """Receive a change notification from a calendar channel.
+
+    Returns:
+        ResponseReturnValue: an empty response
+    """
+    try:
+        user_id, channel_id = _serializer().loads(
+            request.headers.get("X-Goog-Channel-Token", "")
+        )
+    except BadSignature:
+        abort(403)
+    if channel_id != request.headers.get("X-Goog-Channel-ID"):
+        abort(403)
+
+    # the first notification only confirms the channel is open
+    if request.headers.get("X-Goog-Resource-State") != "sync":
+        UserData.mark_calendar_changed(user_id)
+    return "", 204
+
+
+def is_watched(user_data: UserData) -> bool:
+    """Check if every calendar of a user is watched by an open channel.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        bool: True if all changes will be notified
+    """
+    now = datetime.now(UTC)
+    return config.NOTIFICATION_URL is not None and all(
+        _expiration(user_data.watch_channels.get(x)) > now
+        for x in user_data.calendars()
+    )
+
+
+def channels_due(user_data: UserData) -> bool:
+    """Check if a user's channels need opening, renewing or closing.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        bool: True if renew_channels has work to do
+    """
+    if config.NOTIFICATION_URL is None:
+        return bool(user_data.watch_channels)
+    renew_by = datetime.now(UTC) + CHANNEL_RENEWAL
+    return user_data.watch_channels.keys() != set(user_data.calendars()) or any(
+        _expiration(x) < renew_by for x in user_data.watch_channels.values()
+    )
+
+
+def renew_channels(user_data: UserData) -> None:
+    """Watch a user's calendars, renewing channels before they expire.
+
+    A replacement channel is opened before the old one is closed, so no change goes
+    unnotified. Channels of calendars that are no longer synced are closed. Calendars
+    that can't be watched are left to be polled.
+
+    Args:
+        user_data (UserData): the user
+    """
+    from googleapiclient.errors import HttpError
+
+    address = config.NOTIFICATION_URL
+    calendar_ids = user_data.calendars() if address else []
+    renew_by = datetime.now(UTC) + CHANNEL_RENEWAL
+    channels = dict(user_data.watch_channels)
+    try:
+        for calendar_id in calendar_ids:
+            old = channels.get(calendar_id)
+            if _expiration(old) >= renew_by:
+                continue
+            channel_id = str(uuid4())
+            token = _serializer().dumps([user_data.id, channel_id])
+            try:
+                channel = watch_events(
+                    calendar_id, channel_id, address, token, CHANNEL_TTL
+                )
+            except HttpError:
+                logger.exception("failed to watch calendar %s", calendar_id)
+                continue
+            channels[calendar_id] = {
+                "id": channel_id,
+                "resource_id": channel["resourceId"],
+                "expiration": int(channel["expiration"]),
+            }
+            if old is not None:
+                stop_channel(old["id"], old["resource_id"])
+
+        for calendar_id in channels.keys() - set(calendar_ids):
+            old = channels.pop(calendar_id)
+            stop_channel(old["id"], old["resource_id"])
+    finally:
+        # keep the channels opened before any failure
+        user_data.watch_channels = channels
+
+
+def _expiration(channel: dict[str, str | int] | None) -> datetime:
+    """When a channel expires.
+
+    Args:
+        channel (dict[str, str | int] | None): the channel, or None
+
+    Returns:
+        datetime: the expiry time, or the epoch if there is no channel
+    """
+    expiration = channel["expiration"] if channel else 0
+    return datetime.fromtimestamp(expiration / 1000, UTC)
+
+
+def _serializer() -> URLSafeSerializer:
+    """Signs and verifies the channel tokens.
+
+    Returns:
+        URLSafeSerializer: the serializer
+    """
+    return URLSafeSerializer(current_app.secret_key, salt="calendar-channel")
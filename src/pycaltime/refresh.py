@@ -0,0 +1,311 @@
+"""Timesheet refresh.
+
+Timesheets updated within config.TIMESHEET_MAX_AGE, or whose calendars are watched
+for changes and haven't changed, are shown straight from the store. Other
+timesheets are shown too, and refreshed from the calendar after the response. AWS
+Lambda freezes the execution environment once the response is returned, so there
+the refresh runs in an asynchronous invocation of the same function, signed in with
+the user's stored refresh token.
+
+Timesheets are synced before the response instead when weeks are missing, when the
+jobs have changed, or when stale timesheets have no refresh token to sign in with.
+"""
+
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, timedelta
+from functools import cache, partial
+from json import dumps
+from os import environ
+from time import time
+from typing import Any
+from zoneinfo import ZoneInfo
+
+from flask import Flask, Response, after_this_request, current_app, g
+from requests import HTTPError, codes, post
+from requests_oauthlib import OAuth2Session
+
+from pycaltime.calendar import sync_changes, sync_timesheets, user_timezone
+from pycaltime.config import config
+from pycaltime.notifications import channels_due, is_watched, renew_channels
+from pycaltime.stages import run_stages, timed
+from pycaltime.storage import UserData
+from pycaltime.utils import first_day_of_the_week, iterate_weeks
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"  # noqa: S105
+
+# A refresh is requested again if it hasn't finished in this time
+REFRESH_TIMEOUT = timedelta(minutes=2)
+
+logger = logging.getLogger(__name__)
+
+
+def view_weeks(user_data: UserData) -> tuple[date, date, date]:
+    """The current week, and the weeks in view.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        tuple[date, date, date]: the current week, and the start and finish of the
+            weeks in view
+    """
+    timezone = user_timezone(user_data)
+    current_week = first_day_of_the_week(datetime.now(tz=ZoneInfo(timezone)).date())
+    start = current_week - timedelta(weeks=user_data.view_past_weeks)
+    finish = current_week + timedelta(weeks=user_data.view_future_weeks + 1)
+    return current_week, start, finish
+
+
+def load_view_timesheets(start: date, finish: date, user_data: UserData) -> bool:
+    """Load the timesheets in view, requesting a refresh if they are stale.
+
+    Args:
+        start (date): start date
+        finish (date): finish date
+        user_data (UserData): the user
+
+    Returns:
+        bool: True if the timesheets are being refreshed after the response
+    """
+    with timed("timesheets"):
+        user_data.load_timesheets(start, finish)
+
+    # the jobs have changed, or weeks are missing
+    if user_data.jobs_changed() or any(
+        week not in job.timesheets
+        for job in user_data.jobs
+        for week in iterate_weeks(start, finish)
+    ):
+        refresh_timesheets(start, finish, user_data, loaded=True)
+        return False
+
+    if not needs_refresh(user_data):
+        return False
+
+    # without offline access, the timesheets can only be refreshed by this request
+    if user_data.refresh_token is None:
+        refresh_timesheets(start, finish, user_data, loaded=True)
+        return False
+
+    request_refresh(user_data)
+    return True
+
+
+def needs_refresh(user_data: UserData) -> bool:
+    """Check if a user's timesheets may be missing calendar changes.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        bool: True if a change was notified since the last sync, or the calendars
+            aren't watched and the timesheets are older than TIMESHEET_MAX_AGE
+    """
+    if user_data.calendar_changed and (
+        user_data.calendar_changed >= user_data.last_updated
+    ):
+        return True
+    if is_watched(user_data):
+        return False
+    return datetime.now(UTC) - user_data.last_updated >= config.TIMESHEET_MAX_AGE
+
+
+def calendar_version(user_data: UserData) -> object:
+    """Version of a user's calendar events, for the pages that list them.
+
+    Watched calendars keep their version until a change is notified. Others are
+    assumed unchanged for TIMESHEET_MAX_AGE, as timesheets are.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        object: the version
+    """
+    if is_watched(user_data):
+        return user_data.calendar_changed
+    return int(time() // config.TIMESHEET_MAX_AGE.total_seconds())
+
+
+def refresh_timesheets(
+    start: date, finish: date, user_data: UserData, *, loaded: bool = False
+) -> None:
+    """Load the timesheets while listing the calendar changes, and sync them.
+
+    The calendar notification channels are renewed too, if due, once the timesheets
+    are saved.
+
+    Args:
+        start (date): start date
+        finish (date): finish date
+        user_data (UserData): the user
+        loaded (bool, optional): the timesheets are already loaded. Defaults to
+            False.
+    """
+    # changes notified during the sync are newer than the timesheets
+    started = datetime.now(UTC)
+
+    # the changes are listed from copies of the sync state, and the user is
+    # migrated first, so the stages don't change the same UserData attributes
+    user_data.migrate()
+    stages = {
+        "changes": partial(
+            sync_changes,
+            start,
+            user_data.calendars(),
+            dict(user_data.sync_tokens),
+            user_timezone(user_data),
+        )
+    }
+    if not loaded:
+        stages["timesheets"] = partial(user_data.load_timesheets, start, finish)
+    stages = run_stages(**stages)
+    with timed("sync"):
+        sync_timesheets(start, finish, user_data, stages["changes"])
+    user_data.last_updated = started
+    user_data.refresh_requested = None
+    with timed("save"):
+        user_data.save()
+
+    # renewed after saving, so a failure can't lose the synced timesheets
+    if channels_due(user_data):
+        try:
+            with timed("channels"):
+                renew_channels(user_data)
+        except Exception:
+            logger.exception("channel renewal failed for user %s", user_data.id)
+        user_data.save()
+
+
+def request_refresh(user_data: UserData) -> None:
+    """Refresh the user's timesheets after the response, unless already refreshing.
+
+    The refresh signs in with the user's stored refresh token, so no token is
+    passed to it.
+
+    Args:
+        user_data (UserData): the user
+    """
+    if not user_data.claim_refresh(REFRESH_TIMEOUT):
+        return
+
+    payload = {"user_id": user_data.id}
+    if "AWS_LAMBDA_FUNCTION_NAME" in environ:
+        from pycaltime.aws import REFRESH_EVENT
+
+        lambda_client().invoke(
+            FunctionName=environ["AWS_LAMBDA_FUNCTION_NAME"],
+            InvocationType="Event",
+            Payload=dumps({REFRESH_EVENT: payload}),
+        )
+    else:
+        app = current_app._get_current_object()  # noqa: SLF001
+
+        @after_this_request
+        def refresh_after_response(response: Response) -> Response:
+            response.call_on_close(partial(run_refresh, app, payload))
+            return response
+
+
+def run_refresh(app: Flask, payload: dict[str, Any]) -> None:
+    """Refresh a user's timesheets, outside the request that asked for it.
+
+    Args:
+        app (Flask): the app
+        payload (dict[str, Any]): the user id
+    """
+    user_data = UserData.get(payload["user_id"])
+    token = offline_token(user_data)
+    if token is None:
+        return
+
+    with user_context(app, token):
+        _, start, finish = view_weeks(user_data)
+        refresh_timesheets(start, finish, user_data)
+
+
+@contextmanager
+def user_context(app: Flask, token: dict[str, Any]) -> Iterator[None]:
+    """An app context signed in to Google with a user's OAuth token.
+
+    Args:
+        app (Flask): the app
+        token (dict[str, Any]): the OAuth token
+
+    Yields:
+        None: while in the context
+    """
+    with app.app_context():
+        # the flask_dance google proxy uses the OAuth session in g
+        g.flask_dance_google = OAuth2Session(config.GOOGLE_CLIENT_ID, token=token)
+        yield
+
+
+def offline_token(user_data: UserData) -> dict[str, Any] | None:
+    """An OAuth token for a user, from their refresh token.
+
+    A revoked refresh token is removed, so the user isn't refreshed again until they
+    sign in.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        dict[str, Any] | None: the OAuth token, or None if there is no refresh
+            token, or access was revoked
+
+    Raises:
+        HTTPError: if the token couldn't be refreshed for any other reason
+    """
+    if user_data.refresh_token is None:
+        return None
+    try:
+        return refresh_access_token(user_data.refresh_token)
+    except HTTPError as e:
+        if e.response.status_code != codes.bad_request:
+            raise
+    logger.warning("refresh token revoked for user %s", user_data.id)
+    user_data.refresh_token = None
+    user_data.refresh_requested = None
+    user_data.save()
+    return None
+
+
+def refresh_access_token(refresh_token: str) -> dict[str, Any]:
+    """Exchange an offline refresh token for an access token.
+
+    Args:
+        refresh_token (str): the refresh token
+
+    Returns:
+        dict[str, Any]: the OAuth token
+    """
+    response = post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": config.GOOGLE_CLIENT_ID,
+            "client_secret": config.GOOGLE_CLIENT_SECRET,
+        },
+        timeout=10,
+    )
+    response.raise_for_status()
+    token = response.json()
+    token["refresh_token"] = refresh_token
+    token["expires_at"] = time() + token["expires_in"]
+    return token
+
+
+@cache
+def lambda_client() -> Any:  # noqa: ANN401
+    """Lambda client, shared by all requests.
+
+    Returns:
+        Any: the client
+    """
+    import boto3
+
+    return boto3.client("lambda", region_name=config.AWS_REGION)
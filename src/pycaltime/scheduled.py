@@ -0,0 +1,108 @@
+"""Scheduled sync.
+
+Every user who has granted offline access has the timesheets in view refreshed on a
+schedule, so interactive requests find them up to date. Users are read with
+parallel segmented scans, and synced on a pool of workers, which limits how many
+users are synced at once. Each user is claimed before syncing, so no user is
+refreshed by more than one worker or request at a time.
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+
+from flask import Flask
+
+from pycaltime.notifications import channels_due
+from pycaltime.refresh import (
+    REFRESH_TIMEOUT,
+    needs_refresh,
+    offline_token,
+    refresh_timesheets,
+    user_context,
+    view_weeks,
+)
+from pycaltime.storage import UserData
+
+# Parallel scans of the users table
+SCAN_SEGMENTS = 4
+
+# Users synced at once
+SYNC_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+
+def sync_all_users(app: Flask, deadline: float | None = None) -> dict[str, int]:
+    """Refresh the timesheets in view for every user with a refresh token.
+
+    Args:
+        app (Flask): the app
+        deadline (float | None, optional): time.monotonic() after which no more
+            users are started. Defaults to None.
+
+    Returns:
+        dict[str, int]: the number of users synced, unchanged, skipped and failed
+    """
+    counts: Counter[str] = Counter()
+    counts_lock = Lock()
+    slots = BoundedSemaphore(SYNC_WORKERS)
+
+    def finished(future: Future[str]) -> None:
+        with counts_lock:
+            counts[future.result()] += 1
+        slots.release()
+
+    def scan(segment: int) -> None:
+        for user_data in UserData.scan(
+            UserData.refresh_token.exists(),
+            segment=segment,
+            total_segments=SCAN_SEGMENTS,
+        ):
+            if deadline is not None and monotonic() > deadline:
+                return
+            slots.acquire()
+            workers.submit(sync_user, app, user_data).add_done_callback(finished)
+
+    with (
+        ThreadPoolExecutor(SYNC_WORKERS, thread_name_prefix="sync") as workers,
+        ThreadPoolExecutor(SCAN_SEGMENTS, thread_name_prefix="scan") as scanners,
+    ):
+        list(scanners.map(scan, range(SCAN_SEGMENTS)))
+
+    return dict(counts)
+
+
+def sync_user(app: Flask, user_data: UserData) -> str:
+    """Refresh a user's timesheets in view, unless they are already refreshing.
+
+    Users whose watched calendars haven't changed are left unchanged. Errors are
+    logged and counted as failed, so one user can't stop the sync of the others.
+
+    Args:
+        app (Flask): the app
+        user_data (UserData): the user
+
+    Returns:
+        str: "synced", "unchanged", "skipped" or "failed"
+    """
+    if not needs_refresh(user_data) and not channels_due(user_data):
+        return "unchanged"
+
+    try:
+        if not user_data.claim_refresh(REFRESH_TIMEOUT):
+            return "skipped"
+
+        token = offline_token(user_data)
+        if token is None:
+            return "failed"
+
+        with user_context(app, token):
+            _, start, finish = view_weeks(user_data)
+            refresh_timesheets(start, finish, user_data)
+    except Exception:
+        logger.exception("sync failed for user %s", user_data.id)
+        return "failed"
+    return "synced"
@@ -0,0 +1,90 @@
+"""Request stages.
+
+Independent I/O in a view, such as DynamoDB queries and Google API calls, is run
+as named stages on a shared thread pool, in the context of the current request,
+and joined. The time taken by each stage is reported in the Server-Timing response
+header.
+
+The Calendar API service is not thread safe, so only one stage at a time may use
+it.
+"""
+
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from time import perf_counter
+from typing import Any
+
+from flask import Response, g
+
+# Threads shared by all requests, started once per execution environment rather
+# than per request.
+STAGE_WORKERS = 8
+_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+def run_stages(**stages: Callable[[], Any]) -> dict[str, Any]:
+    """Run stages concurrently, and wait for them all to finish.
+
+    Args:
+        **stages (Callable[[], Any]): the stages, by name
+
+    Returns:
+        dict[str, Any]: the result of each stage, by name
+    """
+    g.setdefault("stage_timings", [])
+    futures = {
+        name: _executor.submit(copy_context().run, _run_timed, name, stage)
+        for name, stage in stages.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Time a stage of the request.
+
+    Args:
+        name (str): the stage name
+
+    Yields:
+        None: while the stage runs
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        duration = (perf_counter() - start) * 1000
+        g.setdefault("stage_timings", []).append((name, duration))
+
+
+def add_server_timing(response: Response) -> Response:
+    """Report the stage timings in the Server-Timing header.
+
+    Args:
+        response (Response): the response
+
+    Returns:
+        Response: the response, with the header added
+    """
+    timings = g.get("stage_timings")
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={duration:.1f}" for name, duration in timings
+        )
+    return response
+
+
+def _run_timed(name: str, stage: Callable[[], Any]) -> Any:  # noqa: ANN401
+    """Run a stage, timing it.
+
+    Args:
+        name (str): the stage name
+        stage (Callable[[], Any]): the stage
+
+    Returns:
+        Any: the result of the stage
+    """
+    with timed(name):
+        return stage()
@@ -1,37 +1,56 @@
 """Data storage, using AWS dynamodb database via pynamodb."""
 
 from collections.abc import Iterator
-from dataclasses import dataclass
-from datetime import date
-from json import dumps, loads
+from dataclasses import dataclass, replace
+from datetime import UTC, date, datetime, timedelta
+from json import loads
 from typing import Any
 
 from pynamodb.attributes import (
     Attribute,
     BooleanAttribute,
+    JSONAttribute,
     ListAttribute,
     MapAttribute,
     NumberAttribute,
+    TTLAttribute,
     UnicodeAttribute,
     UTCDateTimeAttribute,
 )
-from pynamodb.constants import STRING
+from pynamodb.constants import PROVISIONED_BILLING_MODE, STRING
+from pynamodb.exceptions import UpdateError
+from pynamodb.expressions.condition import Condition
 from pynamodb.models import Model
 
 from pycaltime.config import config
-from pycaltime.utils import include_from_dict
+from pycaltime.utils import include_from_dict, iterate_weeks
+
+# Version of the flexi time and running totals ledger, to rebuild older ledgers
+LEDGER_VERSION = 1
+
+# Opening flexi time balances of jobs created before they were configurable, by
+# job short name
+LEGACY_OPENING_FLEXI = {"HCT": 980}
 
 
 @dataclass
 @include_from_dict
 class Timesheet:
-    """Timesheet dataclass."""
+    """Timesheet dataclass.
+
+    The flexi time and the to date minutes are running totals, up to the end of the
+    week.
+    """
 
     work: int = 0
     holiday: int = 0
     bank: int = 0
     sick: int = 0
     flexi: int = 0
+    work_to_date: int = 0
+    holiday_to_date: int = 0
+    bank_to_date: int = 0
+    sick_to_date: int = 0
 
     def __init__(
         self,
@@ -40,6 +59,10 @@ class Timesheet:
         bank: int = 0,
         sick: int = 0,
         flexi: int = 0,
+        work_to_date: int = 0,
+        holiday_to_date: int = 0,
+        bank_to_date: int = 0,
+        sick_to_date: int = 0,
     ) -> None:
         """Initializer.
 
@@ -49,12 +72,41 @@ class Timesheet:
             bank (int, optional): bank holiday minutes. Defaults to 0.
             sick (int, optional): sick leave minutes. Defaults to 0.
             flexi (int, optional): flexi time. Defaults to 0.
+            work_to_date (int, optional): working minutes to date. Defaults to 0.
+            holiday_to_date (int, optional): holiday minutes to date. Defaults to 0.
+            bank_to_date (int, optional): bank holiday minutes to date. Defaults to 0.
+            sick_to_date (int, optional): sick leave minutes to date. Defaults to 0.
         """
         self.work = work
         self.holiday = holiday
         self.bank = bank
         self.sick = sick
         self.flexi = flexi
+        self.work_to_date = work_to_date
+        self.holiday_to_date = holiday_to_date
+        self.bank_to_date = bank_to_date
+        self.sick_to_date = sick_to_date
+
+    def hours(self) -> tuple[int, int, int, int]:
+        """Minutes recorded in timesheet, by type.
+
+        Returns:
+            tuple[int, int, int, int]: work, holiday, bank and sick minutes
+        """
+        return (self.work, self.holiday, self.bank, self.sick)
+
+    def hours_to_date(self) -> tuple[int, int, int, int]:
+        """Minutes recorded up to the end of the week, by type.
+
+        Returns:
+            tuple[int, int, int, int]: work, holiday, bank and sick minutes
+        """
+        return (
+            self.work_to_date,
+            self.holiday_to_date,
+            self.bank_to_date,
+            self.sick_to_date,
+        )
 
     def total(self) -> int:
         """Total minutes recorded in timesheet.
@@ -73,7 +125,11 @@ class Timesheet:
 
 
 class TimesheetDict(Attribute):
-    """Timesheet dict Attribute."""
+    """Timesheet dict Attribute.
+
+    The timesheets were stored on the UserData item as a JSON string, before they
+    moved to the Timesheets table. They are only read, to migrate them.
+    """
 
     attr_type = STRING
 
@@ -110,27 +166,6 @@ class TimesheetDict(Attribute):
         """
         yield from sorted(self._data.items())
 
-    def serialize(self, value: dict[date, Timesheet]) -> str:
-        """Serialize value for dynamodb.
-
-        Args:
-            value (dict[date, Timesheet]): values to serialize.
-
-        Returns:
-            str: serialized values
-        """
-        result: dict[str, dict[str, int]] = {}
-        for week, timesheet in value.items():
-            key = f"Y{week.year:02d}M{week.month:02d}D{week.day:02d}"
-            result[key] = {
-                "work": timesheet.work,
-                "holiday": timesheet.holiday,
-                "bank": timesheet.bank,
-                "sick": timesheet.sick,
-                "flexi": timesheet.flexi,
-            }
-        return dumps(result)
-
     def deserialize(self, value: str) -> dict[date, Timesheet]:
         """Deserialize dynamodb values to a dict.
 
@@ -150,7 +185,14 @@ class TimesheetDict(Attribute):
 
 
 class JobData(MapAttribute):
-    """Job Data Attribute."""
+    """Job Data Attribute.
+
+    Timesheets are stored in the Timesheets table, and loaded into the timesheets
+    dict by UserData.load_timesheets. The legacy_timesheets attribute holds the
+    timesheets of users that are yet to be migrated. The opening_flexi attribute is
+    the flexi time, in minutes, at the start of employment, and ledger_version is the
+    version of the running totals stored with the timesheets.
+    """
 
     hashtag = UnicodeAttribute()
     name = UnicodeAttribute()
@@ -160,19 +202,150 @@ class JobData(MapAttribute):
     pro_rata_bank_holiday = BooleanAttribute()
     employment_start = UTCDateTimeAttribute()
     employment_end = UTCDateTimeAttribute()
-    timesheets = TimesheetDict()
-
-    def update_flexi(self) -> None:
-        """Update flexi time."""
-        flexi = 0
-        if self.short_name == "HCT":  ### temporary fix!!!
-            flexi += 980
-        for week, timesheet in self.timesheets.items():
+    opening_flexi = NumberAttribute(null=True)
+    ledger_version = NumberAttribute(default=0)
+    legacy_timesheets = TimesheetDict(attr_name="timesheets", null=True)
+
+    @property
+    def timesheets(self) -> dict[date, Timesheet]:
+        """Loaded timesheets, by week.
+
+        Returns:
+            dict[date, Timesheet]: the timesheets
+        """
+        return self.__dict__.setdefault("_timesheets", {})
+
+    @property
+    def saved_timesheets(self) -> dict[date, Timesheet]:
+        """Copies of the timesheets, as last loaded or saved, by week.
+
+        Returns:
+            dict[date, Timesheet]: the timesheets
+        """
+        return self.__dict__.setdefault("_saved_timesheets", {})
+
+    def modified_weeks(self) -> list[date]:
+        """Weeks with hours changed since they were loaded or saved.
+
+        Returns:
+            list[date]: the weeks
+        """
+        return [
+            week
+            for week, timesheet in self.timesheets.items()
+            if week not in self.saved_timesheets
+            or self.saved_timesheets[week].hours() != timesheet.hours()
+        ]
+
+    def contracted_minutes(self, start: date, finish: date) -> int:
+        """Contracted minutes in the weeks of employment from start to finish.
+
+        Args:
+            start (date): start date
+            finish (date): finish date
+
+        Returns:
+            int: contracted minutes
+        """
+        weeks = sum(
+            1
+            for week in iterate_weeks(start, finish)
+            if self.employment_start.date() <= week < self.employment_end.date()
+        )
+        return weeks * int(self.contracted_hours * 60)
+
+    def update_ledger(self, previous: Timesheet, start: date) -> None:
+        """Update the flexi time and running totals of the loaded timesheets.
+
+        Only the weeks of employment count towards the running totals.
+
+        Args:
+            previous (Timesheet): the running totals carried forward from before
+                the start
+            start (date): the first week to update
+        """
+        flexi = previous.flexi
+        work, holiday, bank, sick = previous.hours_to_date()
+        for week in sorted(week for week in self.timesheets if week >= start):
+            timesheet = self.timesheets[week]
             if self.employment_start.date() <= week < self.employment_end.date():
                 flexi += timesheet.total() - int(self.contracted_hours * 60)
                 timesheet.flexi = flexi
+                work += timesheet.work
+                holiday += timesheet.holiday
+                bank += timesheet.bank
+                sick += timesheet.sick
             else:
                 timesheet.flexi = 0
+            timesheet.work_to_date = work
+            timesheet.holiday_to_date = holiday
+            timesheet.bank_to_date = bank
+            timesheet.sick_to_date = sick
+
+
+class TimesheetItem(Model):
+    """DynamoDB Timesheets Table, with a timesheet for each user, job and week.
+
+    The range key is the job hashtag and week, so each job's timesheets can be
+    queried by range of weeks.
+    """
+
+    class Meta:
+        """Metadata."""
+
+        table_name = "PyCalTimeTimesheets"
+        region = config.AWS_REGION
+
+    user_id = UnicodeAttribute(hash_key=True)
+    key = UnicodeAttribute(range_key=True)
+    work = NumberAttribute(default=0)
+    holiday = NumberAttribute(default=0)
+    bank = NumberAttribute(default=0)
+    sick = NumberAttribute(default=0)
+    flexi = NumberAttribute(default=0)
+    work_to_date = NumberAttribute(default=0)
+    holiday_to_date = NumberAttribute(default=0)
+    bank_to_date = NumberAttribute(default=0)
+    sick_to_date = NumberAttribute(default=0)
+
+    @staticmethod
+    def make_key(hashtag: str, week: date) -> str:
+        """Range key for a job's week.
+
+        Args:
+            hashtag (str): the job hashtag
+            week (date): the week
+
+        Returns:
+            str: the range key
+        """
+        return f"{hashtag}#{week.isoformat()}"
+
+    def week(self) -> date:
+        """The week of the timesheet.
+
+        Returns:
+            date: the week
+        """
+        return date.fromisoformat(self.key.rsplit("#", 1)[1])
+
+    def timesheet(self) -> Timesheet:
+        """The timesheet.
+
+        Returns:
+            Timesheet: the timesheet
+        """
+        return Timesheet(
+            self.work,
+            self.holiday,
+            self.bank,
+            self.sick,
+            self.flexi,
+            self.work_to_date,
+            self.holiday_to_date,
+            self.bank_to_date,
+            self.sick_to_date,
+        )
 
 
 class UserData(Model):
@@ -189,15 +362,482 @@ class UserData(Model):
     view_past_weeks = NumberAttribute(default=4)
     view_future_weeks = NumberAttribute(default=2)
     last_updated = UTCDateTimeAttribute()
+    refresh_requested = UTCDateTimeAttribute(null=True)
+    refresh_token = UnicodeAttribute(null=True)
+    calendar_timezone = UnicodeAttribute(null=True)
+    calendar_metadata_updated = UTCDateTimeAttribute(null=True)
+    calendar_ids = ListAttribute(of=UnicodeAttribute, default=list)
+    sync_tokens = JSONAttribute(default=dict)
+    legacy_event_weeks = JSONAttribute(attr_name="event_weeks", null=True)
+    watch_channels = JSONAttribute(default=dict)
+    calendar_changed = UTCDateTimeAttribute(null=True)
+    timesheets_jobs = JSONAttribute(null=True)
+
+    @classmethod
+    def from_raw_data(cls, data: dict[str, Any]) -> "UserData":
+        """Create a UserData from dynamodb data, recording the saved attributes.
+
+        Args:
+            data (dict[str, Any]): the dynamodb item
+
+        Returns:
+            UserData: the user
+        """
+        user_data = super().from_raw_data(data)
+        user_data.mark_saved()
+        return user_data
+
+    def mark_saved(self) -> None:
+        """Record the current attributes as saved."""
+        self._saved_attributes = self.serialize()
+
+    def save(
+        self, condition: Condition | None = None, *, add_version_condition: bool = True
+    ) -> dict[str, Any]:
+        """Save the UserData, and any changed timesheets.
+
+        A UserData that was loaded from dynamodb is saved with an UpdateItem, setting
+        only the attributes that have changed, or not at all if none have.
+
+        Args:
+            condition (Condition | None, optional): condition for the save. Defaults
+                to None.
+            add_version_condition (bool, optional): see Model.save. Defaults to True.
 
-    def update_flexi(self) -> None:
-        """Update flexi time on all jobs."""
+        Returns:
+            dict[str, Any]: the save response
+        """
+        self.save_timesheets()
+
+        saved = getattr(self, "_saved_attributes", None)
+        if saved is None:
+            response = super().save(
+                condition, add_version_condition=add_version_condition
+            )
+            self.mark_saved()
+            return response
+
+        current = self.serialize()
+        actions = [
+            (
+                attr.set(getattr(self, name))
+                if attr.attr_name in current
+                else attr.remove()
+            )
+            for name, attr in self.get_attributes().items()
+            if current.get(attr.attr_name) != saved.get(attr.attr_name)
+        ]
+        if not actions:
+            return {}
+
+        # keep the jobs, with their loaded timesheets, as update replaces them
+        jobs = self.jobs
+        response = self.update(
+            actions, condition, add_version_condition=add_version_condition
+        )
+        self.jobs = jobs
+        self.mark_saved()
+        return response
+
+    def claim_refresh(self, timeout: timedelta) -> bool:
+        """Record that a refresh has started, unless another one already has.
+
+        A refresh that hasn't finished within the timeout is assumed to have failed.
+        Only the claim is written, and any other unsaved changes are kept for the next
+        save.
+
+        Args:
+            timeout (timedelta): how long a refresh may take
+
+        Returns:
+            bool: True if the refresh was claimed
+
+        Raises:
+            UpdateError: if the update fails for any reason other than the condition
+        """
+        now = datetime.now(UTC)
+        try:
+            # updated through another instance, which update overwrites
+            UserData(self.id).update(
+                [UserData.refresh_requested.set(now)],
+                UserData.refresh_requested.does_not_exist()
+                | (UserData.refresh_requested < now - timeout),
+            )
+        except UpdateError as e:
+            if e.cause_response_code == "ConditionalCheckFailedException":
+                return False
+            raise
+
+        self.refresh_requested = now
+        saved = getattr(self, "_saved_attributes", None)
+        if saved is not None:
+            name = UserData.refresh_requested.attr_name
+            saved[name] = self.serialize()[name]
+        return True
+
+    @classmethod
+    def mark_calendar_changed(cls, user_id: str) -> None:
+        """Record that a user's calendar has changed, without loading the user.
+
+        Args:
+            user_id (str): the user id
+
+        Raises:
+            UpdateError: if the update fails for any reason other than a missing user
+        """
+        try:
+            cls(user_id).update(
+                [cls.calendar_changed.set(datetime.now(UTC))], cls.id.exists()
+            )
+        except UpdateError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+
+    def settings_version(self) -> list[Any]:
+        """The user's settings, to version the pages derived from them.
+
+        Returns:
+            list[Any]: the jobs, calendars and view settings
+        """
+        return [
+            UserData.jobs.serialize(self.jobs),
+            self.calendar_ids,
+            self.calendar_timezone,
+            self.view_past_weeks,
+            self.view_future_weeks,
+        ]
+
+    def jobs_version(self) -> list[list[Any]]:
+        """The job settings that the timesheets are calculated from.
+
+        Returns:
+            list[list[Any]]: the hashtag, hours, employment and opening balance of
+                each job
+        """
+        return [
+            [
+                job.hashtag,
+                job.contracted_hours,
+                job.employment_start.isoformat(),
+                job.employment_end.isoformat(),
+                job.opening_flexi,
+            ]
+            for job in self.jobs
+        ]
+
+    def jobs_changed(self) -> bool:
+        """Check if the jobs have changed since the timesheets were calculated.
+
+        Returns:
+            bool: True if the timesheets need recalculating
+        """
+        return (
+            self.timesheets_jobs is not None
+            and self.timesheets_jobs != self.jobs_version()
+        )
+
+    def calendars(self) -> list[str]:
+        """Ids of the calendars the timesheets are read from.
+
+        Returns:
+            list[str]: the calendar ids, or just the primary calendar if none are set
+        """
+        return self.calendar_ids or ["primary"]
+
+    def load_timesheets(self, start: date, finish: date) -> None:
+        """Load the timesheets between start and finish, with a range query per job.
+
+        Weeks that are already loaded are left unchanged.
+
+        Args:
+            start (date): start date
+            finish (date): finish date
+        """
+        self.migrate()
+        for job in self.jobs:
+            self._load_job_timesheets(job, start, finish)
+
+    def _load_job_timesheets(self, job: JobData, start: date, finish: date) -> None:
+        """Load a job's timesheets between start and finish.
+
+        Args:
+            job (JobData): the job
+            start (date): start date
+            finish (date): finish date
+        """
+        for item in TimesheetItem.query(
+            self.id,
+            TimesheetItem.key.between(
+                TimesheetItem.make_key(job.hashtag, start),
+                TimesheetItem.make_key(job.hashtag, finish),
+            ),
+        ):
+            week = item.week()
+            if week < finish and week not in job.timesheets:
+                job.timesheets[week] = item.timesheet()
+                job.saved_timesheets[week] = item.timesheet()
+
+    def save_timesheets(self) -> None:
+        """Save the timesheets that have changed since they were loaded."""
+        with TimesheetItem.batch_write() as batch:
+            for job in self.jobs:
+                for week, timesheet in job.timesheets.items():
+                    if job.saved_timesheets.get(week) != timesheet:
+                        batch.save(
+                            TimesheetItem(
+                                user_id=self.id,
+                                key=TimesheetItem.make_key(job.hashtag, week),
+                                work=timesheet.work,
+                                holiday=timesheet.holiday,
+                                bank=timesheet.bank,
+                                sick=timesheet.sick,
+                                flexi=timesheet.flexi,
+                                work_to_date=timesheet.work_to_date,
+                                holiday_to_date=timesheet.holiday_to_date,
+                                bank_to_date=timesheet.bank_to_date,
+                                sick_to_date=timesheet.sick_to_date,
+                            )
+                        )
+                        job.saved_timesheets[week] = replace(timesheet)
+
+    def migrate(self) -> None:
+        """Migrate the user to the current storage layout.
+
+        Legacy timesheets and event weeks are moved from the UserData item to the
+        Timesheets and EventWeeks tables, jobs without an opening flexi time balance
+        are given one, which is zero unless the job has legacy timesheets, and older
+        ledgers are rebuilt from the start of employment.
+        """
+        if not self.legacy_event_weeks and not any(
+            job.legacy_timesheets
+            or job.opening_flexi is None
+            or job.ledger_version < LEDGER_VERSION
+            for job in self.jobs
+        ):
+            return
+
+        for job in self.jobs:
+            if job.opening_flexi is None:
+                # only jobs from before the migration have a legacy balance
+                job.opening_flexi = (
+                    LEGACY_OPENING_FLEXI.get(job.short_name, 0)
+                    if job.legacy_timesheets is not None
+                    else 0
+                )
+            job.timesheets.update(job.legacy_timesheets or {})
+            job.legacy_timesheets = None
+            if job.ledger_version < LEDGER_VERSION:
+                self._update_job_ledger(job, job.employment_start.date())
+                job.ledger_version = LEDGER_VERSION
+
+        with EventWeek.batch_write() as batch:
+            for event_id, week in (self.legacy_event_weeks or {}).items():
+                batch.save(EventWeek(self.id, event_id, week=week))
+        self.legacy_event_weeks = None
+        self.save()
+
+    def update_flexi(self, start: date | None = None) -> None:
+        """Update the flexi time and running totals ledger of all jobs.
+
+        Each timesheet holds the flexi time balance and the running totals at the
+        end of its week, so only the weeks from the earliest modified week onwards
+        are updated, carrying forward the totals from the stored week before.
+
+        Args:
+            start (date | None): update from this week, even if unmodified, such as
+                after changing a job's contracted hours
+        """
         for job in self.jobs:
-            job.update_flexi()
+            modified = job.modified_weeks()
+            if start is not None:
+                modified.append(start)
+            if modified:
+                self._update_job_ledger(job, min(modified))
+
+    def _update_job_ledger(self, job: JobData, first: date) -> None:
+        """Update a job's ledger from the first week onwards.
+
+        The stored weeks after the first week are loaded, to keep their running
+        totals in step.
+
+        Args:
+            job (JobData): the job
+            first (date): the first week to update
+        """
+        self._load_job_timesheets(job, first, date.max)
+
+        item = self._latest_timesheet_item(job, first)
+        if item is not None and job.employment_start.date() <= item.week():
+            job.update_ledger(item.timesheet(), first)
+        else:
+            job.update_ledger(Timesheet(flexi=job.opening_flexi or 0), first)
+
+    def _latest_timesheet_item(
+        self, job: JobData, before: date
+    ) -> TimesheetItem | None:
+        """Find a job's latest stored timesheet before a date.
+
+        Args:
+            job (JobData): the job
+            before (date): the date
+
+        Returns:
+            TimesheetItem | None: the timesheet item, if there is one
+        """
+        items = TimesheetItem.query(
+            self.id,
+            TimesheetItem.key.between(
+                TimesheetItem.make_key(job.hashtag, date.min),
+                TimesheetItem.make_key(job.hashtag, before - timedelta(days=1)),
+            ),
+            scan_index_forward=False,
+            limit=1,
+        )
+        return next(iter(items), None)
+
+    def totals(self, job: JobData, start: date, finish: date) -> Timesheet:
+        """Total minutes recorded for a job in the weeks from start to finish.
+
+        Calculated from the stored running totals, with two single item queries
+        whatever the length of the period, so the timesheets must be saved first.
+
+        Args:
+            job (JobData): the job
+            start (date): start date
+            finish (date): finish date
+
+        Returns:
+            Timesheet: the total work, holiday, bank and sick minutes
+        """
+        totals = []
+        for day in (start, finish):
+            item = self._latest_timesheet_item(job, day)
+            totals.append(item.timesheet().hours_to_date() if item else (0, 0, 0, 0))
+        return Timesheet(*(b - a for a, b in zip(*totals, strict=True)))
+
+
+class WeekEvents(Model):
+    """DynamoDB WeekEvents Table, the calendar events for each user and week.
+
+    Events are stored as normalized records, with the title, hashtags, start,
+    finish and location of each event, and a hash of the records.
+    """
+
+    class Meta:
+        """Metadata."""
+
+        table_name = "PyCalTimeEvents"
+        region = config.AWS_REGION
+
+    user_id = UnicodeAttribute(hash_key=True)
+    week = UnicodeAttribute(range_key=True)
+    events = JSONAttribute()
+    content_hash = UnicodeAttribute()
+
+
+class EventWeek(Model):
+    """DynamoDB EventWeeks Table, the stored week of each of a user's events.
+
+    Used to find the weeks affected by moved and cancelled events, whose new
+    details don't say where they were before.
+    """
+
+    class Meta:
+        """Metadata."""
+
+        table_name = "PyCalTimeEventWeeks"
+        region = config.AWS_REGION
+
+    user_id = UnicodeAttribute(hash_key=True)
+    event_id = UnicodeAttribute(range_key=True)
+    week = UnicodeAttribute()
+
+
+class Distance(Model):
+    """DynamoDB Distance Table, caching driving distances in meters."""
+
+    class Meta:
+        """Metadata."""
+
+        table_name = "PyCalTimeDistances"
+        region = config.AWS_REGION
+
+    origin = UnicodeAttribute(hash_key=True)
+    destination = UnicodeAttribute(range_key=True)
+    meters = NumberAttribute()
+    expires = TTLAttribute()
+
+
+# the DynamoDB tables
+TABLES: tuple[type[Model], ...] = (
+    UserData,
+    TimesheetItem,
+    WeekEvents,
+    EventWeek,
+    Distance,
+)
 
 
 # initialise the database
-def initialize_database() -> None:
-    """Initialize the database."""
-    if not UserData.exists():
-        UserData.create_table(read_capacity_units=1, write_capacity_units=1, wait=True)
+def initialize_database(
+    billing_mode: str = PROVISIONED_BILLING_MODE,
+    read_capacity_units: int = 1,
+    write_capacity_units: int = 1,
+) -> None:
+    """Initialize the database, creating and migrating the tables.
+
+    Missing tables are created, and existing tables are switched to the billing mode
+    and capacity. Time to live is enabled on tables with a TTLAttribute.
+
+    Args:
+        billing_mode (str, optional): PROVISIONED or PAY_PER_REQUEST. Defaults to
+            PROVISIONED.
+        read_capacity_units (int, optional): read capacity, when provisioned.
+            Defaults to 1.
+        write_capacity_units (int, optional): write capacity, when provisioned.
+            Defaults to 1.
+    """
+    import boto3
+
+    client = boto3.client("dynamodb", region_name=config.AWS_REGION)
+    capacity = (
+        {
+            "ReadCapacityUnits": read_capacity_units,
+            "WriteCapacityUnits": write_capacity_units,
+        }
+        if billing_mode == PROVISIONED_BILLING_MODE
+        else None
+    )
+
+    for table in TABLES:
+        if table.exists():
+            # migrate the billing mode and capacity
+            description = client.describe_table(TableName=table.Meta.table_name)
+            current_mode = description["Table"].get("BillingModeSummary", {})
+            current_capacity = {
+                k: v
+                for k, v in description["Table"]["ProvisionedThroughput"].items()
+                if k in ("ReadCapacityUnits", "WriteCapacityUnits")
+            }
+            if current_mode.get("BillingMode", PROVISIONED_BILLING_MODE) != (
+                billing_mode
+            ) or (capacity is not None and current_capacity != capacity):
+                client.update_table(
+                    TableName=table.Meta.table_name,
+                    BillingMode=billing_mode,
+                    **({"ProvisionedThroughput": capacity} if capacity else {}),
+                )
+                client.get_waiter("table_exists").wait(TableName=table.Meta.table_name)
+
+        table.create_table(
+            wait=True,
+            billing_mode=billing_mode,
+            read_capacity_units=read_capacity_units if capacity else None,
+            write_capacity_units=write_capacity_units if capacity else None,
+        )
+
+
+def migrate_database() -> None:
+    """Migrate the data of all users to the current storage layout."""
+    for user_data in UserData.scan():
+        user_data.migrate()
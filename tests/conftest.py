@@ -0,0 +1,270 @@
+"""Test fixtures, with AWS mocked by moto and a fake Calendar API."""
+
+import os
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import httplib2
+import pytest
+from flask import Flask
+from googleapiclient.errors import HttpError
+from moto import mock_aws
+
+# settings that would otherwise be loaded from AWS Secrets Manager
+os.environ |= {
+    "FLASK_SECRET_KEY": "secret",
+    "GOOGLE_CLIENT_ID": "client-id",
+    "GOOGLE_CLIENT_SECRET": "client-secret",
+    "GOOGLE_MAPS_API_KEY": "maps-key",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "eu-west-2",
+}
+
+from pycaltime import google
+from pycaltime.app import create_app
+from pycaltime.storage import JobData, UserData, initialize_database
+
+TIMEZONE = "Europe/London"
+
+
+class FakeRequest:
+    """An API request, executed by calling a function."""
+
+    def __init__(self, execute: Callable[[], dict[str, Any]]) -> None:
+        """Initializer.
+
+        Args:
+            execute (Callable[[], dict[str, Any]]): returns the response
+        """
+        self._execute = execute
+        self.http = httplib2.Http()
+        self.http.credentials = None
+
+    def execute(self, http: object = None) -> dict[str, Any]:  # noqa: ARG002
+        """Execute the request.
+
+        Args:
+            http (object, optional): the http connection, which is ignored.
+                Defaults to None.
+
+        Returns:
+            dict[str, Any]: the response
+        """
+        return self._execute()
+
+
+class FakeCalendar:
+    """A Calendar API service with a single, primary, calendar.
+
+    The service's events, calendarList and channels resources are the calendar
+    itself.
+    """
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self.items: dict[str, dict[str, Any]] = {}
+        self.changed: set[str] = set()
+        self.open_channels: dict[str, dict[str, Any]] = {}
+
+    def add(self, event_id: str, title: str, start: datetime, minutes: int) -> None:
+        """Add or move an event.
+
+        Args:
+            event_id (str): the event id
+            title (str): the title, with its hashtags
+            start (datetime): the start time
+            minutes (int): the duration
+        """
+        self.items[event_id] = {
+            "id": event_id,
+            "iCalUID": f"{event_id}@google.com",
+            "status": "confirmed",
+            "summary": title,
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+        }
+        self.changed.add(event_id)
+
+    def delete(self, event_id: str) -> None:
+        """Delete an event.
+
+        Args:
+            event_id (str): the event id
+        """
+        self.items[event_id] = {"id": event_id, "status": "cancelled"}
+        self.changed.add(event_id)
+
+    def events(self) -> "FakeCalendar":
+        """The events resource.
+
+        Returns:
+            FakeCalendar: the calendar
+        """
+        return self
+
+    def calendarList(self) -> "FakeCalendar":  # noqa: N802
+        """The calendar list resource.
+
+        Returns:
+            FakeCalendar: the calendar
+        """
+        return self
+
+    def channels(self) -> "FakeCalendar":
+        """The channels resource.
+
+        Returns:
+            FakeCalendar: the calendar
+        """
+        return self
+
+    def list(self, **kwargs: Any) -> FakeRequest:  # noqa: ANN401
+        """List the calendars, the events in a time range, or the changed events.
+
+        Args:
+            **kwargs (Any): the query
+
+        Returns:
+            FakeRequest: the request
+        """
+        if "calendarId" not in kwargs:
+            calendar = {"id": "primary", "primary": True, "timeZone": TIMEZONE}
+            return FakeRequest(lambda: {"items": [calendar]})
+
+        def execute() -> dict[str, Any]:
+            if "syncToken" in kwargs:
+                items = [self.items[x] for x in sorted(self.changed)]
+            else:
+                items = sorted(
+                    (
+                        x
+                        for x in self.items.values()
+                        if x["status"] == "confirmed"
+                        and x["end"]["dateTime"] > kwargs.get("timeMin", "")
+                        and x["start"]["dateTime"] < kwargs.get("timeMax", "~")
+                    ),
+                    key=lambda x: x["start"]["dateTime"],
+                )
+            if "timeMax" not in kwargs:
+                self.changed.clear()
+            return {"items": items, "nextSyncToken": "sync-token"}
+
+        return FakeRequest(execute)
+
+    def watch(self, calendarId: str, body: dict[str, Any]) -> FakeRequest:  # noqa: N803
+        """Open a notification channel.
+
+        Args:
+            calendarId (str): the calendar id
+            body (dict[str, Any]): the channel
+
+        Returns:
+            FakeRequest: the request
+        """
+        expiration = datetime.now(UTC) + timedelta(seconds=int(body["params"]["ttl"]))
+        channel = body | {
+            "calendarId": calendarId,
+            "resourceId": f"resource-{calendarId}",
+            "expiration": str(int(expiration.timestamp() * 1000)),
+        }
+
+        def execute() -> dict[str, Any]:
+            self.open_channels[body["id"]] = channel
+            return channel
+
+        return FakeRequest(execute)
+
+    def stop(self, body: dict[str, Any]) -> FakeRequest:
+        """Close a notification channel.
+
+        Args:
+            body (dict[str, Any]): the channel id and resource id
+
+        Returns:
+            FakeRequest: the request
+        """
+
+        def execute() -> dict[str, Any]:
+            if self.open_channels.pop(body["id"], None) is None:
+                raise HttpError(httplib2.Response({"status": 404}), b"Not Found")
+            return {}
+
+        return FakeRequest(execute)
+
+
+@pytest.fixture
+def aws() -> Iterator[None]:
+    """Mock AWS, with the tables created.
+
+    Yields:
+        None: while mocked
+    """
+    with mock_aws():
+        initialize_database()
+        yield
+
+
+@pytest.fixture
+def calendar(monkeypatch: pytest.MonkeyPatch) -> FakeCalendar:
+    """A fake Calendar API, used in place of the real one.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+
+    Returns:
+        FakeCalendar: the calendar
+    """
+    fake = FakeCalendar()
+    monkeypatch.setattr(google, "api_service", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def app() -> Flask:
+    """The app, for testing.
+
+    Returns:
+        Flask: the app
+    """
+    return create_app({"TESTING": True})
+
+
+@pytest.fixture
+def make_user(aws: None) -> Callable[..., UserData]:  # noqa: ARG001
+    """Create and save users with a single #work job.
+
+    Args:
+        aws (None): the aws fixture
+
+    Returns:
+        Callable[..., UserData]: creates a user from an id and any other attributes
+    """
+
+    def make(user_id: str, **kwargs: Any) -> UserData:  # noqa: ANN401
+        job = JobData(
+            hashtag="#work",
+            name="Work",
+            short_name="Work",
+            contracted_hours=10,
+            annual_holiday_hours=0,
+            pro_rata_bank_holiday=False,
+            employment_start=datetime(2020, 1, 6, tzinfo=UTC),
+            employment_end=datetime(2099, 1, 5, tzinfo=UTC),
+            opening_flexi=0,
+        )
+        user_data = UserData(
+            id=user_id,
+            **{
+                "jobs": [job],
+                "last_updated": datetime.now(UTC) - timedelta(days=1),
+                "calendar_timezone": TIMEZONE,
+                "calendar_metadata_updated": datetime.now(UTC),
+            }
+            | kwargs,
+        )
+        user_data.save()
+        return UserData.get(user_id)
+
+    return make
@@ -0,0 +1,149 @@
+"""Tests of totalling events into timesheets."""
+
+import os
+from collections.abc import Callable
+from dataclasses import replace
+from datetime import UTC, date, datetime, timedelta
+from random import Random
+from time import perf_counter
+
+import pytest
+
+from pycaltime.calendar import add_events
+from pycaltime.google import CalendarEvent
+from pycaltime.storage import JobData, Timesheet, UserData
+from pycaltime.utils import first_day_of_the_week
+
+HASHTAGS = ["#work", "#other", "#holiday", "#bank", "#sick", "#misc"]
+FIRST_WEEK = date(2020, 1, 6)
+
+
+def make_user() -> UserData:
+    """A user with two jobs, that isn't saved.
+
+    Returns:
+        UserData: the user
+    """
+    jobs = [
+        JobData(
+            hashtag=hashtag,
+            name=hashtag,
+            short_name=hashtag,
+            contracted_hours=10,
+            annual_holiday_hours=0,
+            pro_rata_bank_holiday=False,
+            employment_start=datetime(2020, 1, 6, tzinfo=UTC),
+            employment_end=datetime(2099, 1, 5, tzinfo=UTC),
+        )
+        for hashtag in ("#Work", "#other")
+    ]
+    return UserData(id="user", jobs=jobs)
+
+
+def make_events(
+    count: int, weeks: int, seed: int = 0
+) -> dict[date, list[CalendarEvent]]:
+    """Random events, with every combination of job and leave hashtags.
+
+    Args:
+        count (int): the number of events
+        weeks (int): the number of weeks they are spread over
+        seed (int, optional): the random seed. Defaults to 0.
+
+    Returns:
+        dict[date, list[CalendarEvent]]: the events for each week
+    """
+    random = Random(seed)  # noqa: S311
+    week_events = {FIRST_WEEK + timedelta(weeks=i): [] for i in range(weeks)}
+    for i in range(count):
+        start = datetime.combine(FIRST_WEEK, datetime.min.time(), UTC) + timedelta(
+            minutes=15 * random.randrange(weeks * 7 * 96)
+        )
+        tags = random.sample(HASHTAGS, random.randrange(len(HASHTAGS)))
+        event = CalendarEvent(
+            title=f"Event {' '.join(tags[:1]).upper()}",
+            description=" ".join(tags[1:]),
+            location="",
+            start=start,
+            finish=start + timedelta(minutes=random.randrange(1, 600)),
+            id=str(i),
+        )
+        week_events[first_day_of_the_week(start.date())].append(event)
+    return week_events
+
+
+def baseline_add_events(
+    week_events: dict[date, list[CalendarEvent]], user_data: UserData
+) -> None:
+    """The original add_events loop, to check the results against.
+
+    Args:
+        week_events (dict[date, list[CalendarEvent]]): the events for each week
+        user_data (UserData): the user
+    """
+    job_hashtags = {job.hashtag.lower() for job in user_data.jobs}
+    job_for_hashtag = {job.hashtag.lower(): job for job in user_data.jobs}
+
+    for week, events in week_events.items():
+        for job in user_data.jobs:
+            job.timesheets[week] = replace(
+                job.timesheets.get(week, Timesheet()), work=0, holiday=0, bank=0, sick=0
+            )
+
+        for event in events:
+            for x in job_hashtags & event.hashtags():
+                if "#holiday" in event.hashtags():
+                    job_for_hashtag[x].timesheets[week].holiday += event.duration()
+                elif "#bank" in event.hashtags():
+                    job_for_hashtag[x].timesheets[week].bank += event.duration()
+                elif "#sick" in event.hashtags():
+                    job_for_hashtag[x].timesheets[week].sick += event.duration()
+                else:
+                    job_for_hashtag[x].timesheets[week].work += event.duration() // len(
+                        job_hashtags & event.hashtags()
+                    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_baseline(seed: int) -> None:
+    """add_events totals the same minutes as the original loop."""
+    week_events = make_events(2000, 52, seed)
+    expected = make_user()
+    baseline_add_events(week_events, expected)
+    actual = make_user()
+    add_events(week_events, actual)
+
+    for x, y in zip(expected.jobs, actual.jobs, strict=True):
+        assert x.timesheets == y.timesheets
+
+
+def test_keeps_running_totals() -> None:
+    """The running totals of replaced timesheets are kept."""
+    user_data = make_user()
+    user_data.jobs[0].timesheets[FIRST_WEEK] = Timesheet(work=60, flexi=30)
+
+    add_events({FIRST_WEEK: []}, user_data)
+
+    assert user_data.jobs[0].timesheets[FIRST_WEEK] == Timesheet(flexi=30)
+
+
+@pytest.mark.skipif(
+    "PYCALTIME_BENCHMARK" not in os.environ,
+    reason="set PYCALTIME_BENCHMARK to run the benchmark",
+)
+def test_benchmark() -> None:
+    """Time add_events against the original loop, on a 5 year calendar."""
+
+    def timed(add: Callable[..., None]) -> float:
+        best = float("inf")
+        for _ in range(5):
+            week_events = make_events(20000, 5 * 52)
+            user_data = make_user()
+            started = perf_counter()
+            add(week_events, user_data)
+            best = min(best, perf_counter() - started)
+        return best
+
+    baseline = timed(baseline_add_events)
+    optimized = timed(add_events)
+    print(f"add_events: {optimized:.3f}s, baseline: {baseline:.3f}s")
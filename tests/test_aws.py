@@ -0,0 +1,60 @@
+"""Tests of the Lambda entry points."""
+
+import os
+import subprocess
+import sys
+
+# settings that would otherwise be loaded from AWS Secrets Manager
+SETTINGS = {
+    "FLASK_SECRET_KEY": "secret",
+    "GOOGLE_CLIENT_ID": "client-id",
+    "GOOGLE_CLIENT_SECRET": "client-secret",
+    "GOOGLE_MAPS_API_KEY": "maps-key",
+}
+
+# Import time budget of the handler, as a multiple of the time taken to import
+# flask, so that it doesn't depend on the speed of the machine. The handler takes
+# a little over twice as long as flask, and loading the API clients and storage
+# eagerly would take it to nearly five times.
+IMPORT_TIME_BUDGET = 3
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Import a module in a new interpreter, recording the import times.
+
+    Args:
+        module (str): the module name
+
+    Returns:
+        dict[str, int]: the cumulative import time of each module imported, in
+            microseconds
+    """
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env={**os.environ, **SETTINGS, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cold_start_imports() -> None:
+    """Importing the handler doesn't load the storage or API clients."""
+    loaded = {name.split(".")[0] for name in import_times("pycaltime.aws")}
+    assert "pycaltime" in loaded
+    assert not loaded & {"pynamodb", "botocore", "googleapiclient", "googlemaps"}
+
+
+def test_cold_start_import_time() -> None:
+    """Importing the handler takes no longer than the budget, in the best of 3."""
+    ratio = min(
+        times["pycaltime.aws"] / times["flask"]
+        for times in (import_times("pycaltime.aws") for _ in range(3))
+    )
+    assert ratio < IMPORT_TIME_BUDGET
@@ -0,0 +1,78 @@
+"""Tests of the bank holidays."""
+
+from datetime import date
+from json import dumps
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from pycaltime import bank_holidays
+
+NEW_YEAR = {"New Year": date(2024, 1, 1)}
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Cache the bank holidays in a temporary directory, starting empty.
+
+    Args:
+        tmp_path (Path): the tmp_path fixture
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+
+    Returns:
+        Path: the cache path
+    """
+    path = tmp_path / "bank-holidays.json"
+    monkeypatch.setattr(bank_holidays, "CACHE_PATH", path)
+    monkeypatch.setattr(bank_holidays, "_cache", {})
+    monkeypatch.setattr(bank_holidays, "_holidays", {})
+    return path
+
+
+def downloaded(text: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Download some text from gov.uk.
+
+    Args:
+        text (str): the response text
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+    """
+    response = SimpleNamespace(status_code=200, text=text, headers={"ETag": "new"})
+    monkeypatch.setattr(bank_holidays, "get", lambda *_, **__: response)
+
+
+def test_cache_without_data(cache_path: Path) -> None:
+    """A cached copy without its data is replaced by the bundled snapshot."""
+    cache_path.write_text(dumps({"etag": "old", "checked": 0.0}))
+
+    bank_holidays._load()  # noqa: SLF001
+
+    holidays = bank_holidays._holidays  # noqa: SLF001
+    assert holidays[2024]["Christmas Day"] == date(2024, 12, 25)
+    assert bank_holidays._cache["etag"] is None  # noqa: SLF001
+
+
+def test_malformed_download(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A malformed download leaves the current bank holidays in place."""
+    bank_holidays._load()  # noqa: SLF001
+    holidays = bank_holidays._holidays  # noqa: SLF001
+
+    downloaded(dumps({"scotland": {}}), monkeypatch)
+    bank_holidays.refresh_bank_holidays()
+
+    assert bank_holidays._holidays is holidays  # noqa: SLF001
+    assert bank_holidays._cache["etag"] is None  # noqa: SLF001
+
+
+def test_download(cache_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A new download replaces the bank holidays, and is cached."""
+    bank_holidays._load()  # noqa: SLF001
+
+    events = [{"title": "New Year", "date": "2024-01-01"}]
+    downloaded(dumps({"england-and-wales": {"events": events}}), monkeypatch)
+    bank_holidays.refresh_bank_holidays()
+
+    assert bank_holidays.bank_holidays(2024) == NEW_YEAR
+    bank_holidays._cache.clear()  # noqa: SLF001
+    assert bank_holidays.bank_holidays(2024) == NEW_YEAR
+    assert "new" in cache_path.read_text()
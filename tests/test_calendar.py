@@ -0,0 +1,136 @@
+"""Tests of the timesheet sync."""
+
+from collections.abc import Callable
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from pycaltime.calendar import sync_timesheets
+from pycaltime.storage import EventWeek, UserData
+from pycaltime.utils import first_day_of_the_week
+from tests.conftest import TIMEZONE, FakeCalendar
+
+# the weeks in view when the event is added, and later
+THIS_WEEK = first_day_of_the_week(date.today())  # noqa: DTZ011
+EVENT_WEEK = THIS_WEEK - timedelta(weeks=2)
+START = EVENT_WEEK - timedelta(weeks=1)
+LATER_START = THIS_WEEK
+FINISH = THIS_WEEK + timedelta(weeks=2)
+
+
+def sync(user_id: str, start: date) -> None:
+    """Sync a user's timesheets from start, as a refresh does.
+
+    Args:
+        user_id (str): the user id
+        start (date): start date
+    """
+    user_data = UserData.get(user_id)
+    user_data.load_timesheets(start, FINISH)
+    sync_timesheets(start, FINISH, user_data)
+    user_data.save()
+
+
+def work(user_id: str, week: date) -> int:
+    """Minutes worked in a week.
+
+    Args:
+        user_id (str): the user id
+        week (date): the week
+
+    Returns:
+        int: the minutes
+    """
+    user_data = UserData.get(user_id)
+    user_data.load_timesheets(week, week + timedelta(weeks=1))
+    return user_data.jobs[0].timesheets[week].work
+
+
+def at(week: date, hour: int) -> datetime:
+    """The time on the first day of a week.
+
+    Args:
+        week (date): the week
+        hour (int): the hour
+
+    Returns:
+        datetime: the time
+    """
+    return datetime.combine(week, time(hour), ZoneInfo(TIMEZONE))
+
+
+@pytest.fixture
+def user(calendar: FakeCalendar, make_user: Callable[..., UserData]) -> str:
+    """A user, synced with an hour's work in the event week.
+
+    Args:
+        calendar (FakeCalendar): the calendar fixture
+        make_user (Callable[..., UserData]): the make_user fixture
+
+    Returns:
+        str: the user id
+    """
+    calendar.add("event", "Meeting #work", at(EVENT_WEEK, 10), 60)
+    make_user("user")
+    sync("user", START)
+    assert work("user", EVENT_WEEK) == 60
+    return "user"
+
+
+def test_delete_before_start(calendar: FakeCalendar, user: str) -> None:
+    """Deleting an event from before the weeks in view updates its week."""
+    sync(user, LATER_START)
+    calendar.delete("event")
+    sync(user, LATER_START)
+
+    assert work(user, EVENT_WEEK) == 0
+    assert EventWeek.count(user) == 0
+
+
+def test_move_from_before_start(calendar: FakeCalendar, user: str) -> None:
+    """Moving an event from before the weeks in view only counts it once."""
+    sync(user, LATER_START)
+    calendar.add("event", "Meeting #work", at(THIS_WEEK, 10), 60)
+    sync(user, LATER_START)
+
+    assert work(user, EVENT_WEEK) == 0
+    assert work(user, THIS_WEEK) == 60
+    assert EventWeek.get(user, "event").week == THIS_WEEK.isoformat()
+
+
+def test_full_sync_forgets_missing_events(calendar: FakeCalendar, user: str) -> None:
+    """A full sync forgets the indexed events it no longer finds."""
+    calendar.items.pop("event")
+    user_data = UserData.get(user)
+    user_data.sync_tokens = {}
+    user_data.save()
+    sync(user, START)
+
+    assert work(user, EVENT_WEEK) == 0
+    assert EventWeek.count(user) == 0
+
+
+@pytest.mark.usefixtures("calendar")
+def test_sync_without_jobs(make_user: Callable[..., UserData]) -> None:
+    """Users without jobs are synced, incrementally too."""
+    make_user("user", jobs=[])
+    sync("user", START)
+    sync("user", START)
+
+    assert UserData.get("user").sync_tokens == {"primary": "sync-token"}
+
+
+def test_jobs_changed(make_user: Callable[..., UserData], user: str) -> None:
+    """Changing a job's hours recalculates the stored weeks, as a first sync would."""
+    for user_id in (user, make_user("fresh").id):
+        user_data = UserData.get(user_id)
+        user_data.jobs[0].contracted_hours = 1
+        user_data.save()
+        sync(user_id, START)
+
+    expected, actual = (UserData.get(x) for x in ("fresh", user))
+    for user_data in (expected, actual):
+        user_data.load_timesheets(START, FINISH)
+    assert actual.jobs[0].timesheets == expected.jobs[0].timesheets
+    assert not actual.jobs_changed()
@@ -0,0 +1,23 @@
+"""Tests of the configuration."""
+
+from json import dumps
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from pycaltime.config import Config
+
+
+@mock_aws
+def test_secrets_retried_after_failure() -> None:
+    """Secrets that fail to load are loaded again on next use."""
+    config = Config()
+    with pytest.raises(ClientError):
+        _ = config.aws_secrets
+
+    boto3.client("secretsmanager", region_name=config.AWS_REGION).create_secret(
+        Name="pycaltime", SecretString=dumps({"GOOGLE_CLIENT_ID": "client-id"})
+    )
+    assert config.aws_secrets == {"GOOGLE_CLIENT_ID": "client-id"}
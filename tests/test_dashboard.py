@@ -0,0 +1,219 @@
+"""Tests of the dashboard views."""
+
+from collections.abc import Callable
+from datetime import datetime
+from time import time
+from types import SimpleNamespace
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import pytest
+from flask import Flask, g, session
+from flask.testing import FlaskClient
+
+from pycaltime import google, refresh
+from pycaltime.dashboard.user import load_user_data
+from pycaltime.google import get_user_info, invalidate_user_info
+from pycaltime.refresh import view_weeks
+from pycaltime.storage import UserData
+from tests.conftest import TIMEZONE, FakeCalendar
+
+
+def user_info(user_id: str) -> dict[str, Any]:
+    """A user's Google profile.
+
+    Args:
+        user_id (str): the user id
+
+    Returns:
+        dict[str, Any]: the profile
+    """
+    return {
+        "id": user_id,
+        "name": "User",
+        "given_name": "User",
+        "family_name": "",
+        "email": "user@example.com",
+        "verified_email": True,
+    }
+
+
+def oauth_token(**kwargs: Any) -> dict[str, Any]:  # noqa: ANN401
+    """A Google OAuth token.
+
+    Args:
+        **kwargs (Any): any other fields of the token
+
+    Returns:
+        dict[str, Any]: the token
+    """
+    return {
+        "access_token": "access",
+        "token_type": "Bearer",
+        "expires_in": 3600,
+        "expires_at": time() + 3600,
+    } | kwargs
+
+
+def sign_in(app: Flask, user_id: str) -> FlaskClient:
+    """A test client, signed in to Google as a user.
+
+    Args:
+        app (Flask): the app
+        user_id (str): the user id
+
+    Returns:
+        FlaskClient: the client
+    """
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session["google_oauth_token"] = oauth_token()
+        client_session["user_info"] = user_info(user_id)
+    return client
+
+
+def this_week_minutes(user_id: str) -> int:
+    """Minutes worked this week, as stored.
+
+    Args:
+        user_id (str): the user id
+
+    Returns:
+        int: the minutes
+    """
+    user_data = UserData.get(user_id)
+    current_week, start, finish = view_weeks(user_data)
+    user_data.load_timesheets(start, finish)
+    return user_data.jobs[0].timesheets[current_week].work
+
+
+def add_work(calendar: FakeCalendar, minutes: int) -> None:
+    """Add work to the start of today.
+
+    Args:
+        calendar (FakeCalendar): the calendar
+        minutes (int): the minutes worked
+    """
+    today = datetime.now(ZoneInfo(TIMEZONE)).replace(hour=0, minute=0)
+    calendar.add("event", "Meeting #work", today, minutes)
+
+
+@pytest.mark.usefixtures("calendar")
+def test_timesheet_not_modified(app: Flask, make_user: Callable[..., UserData]) -> None:
+    """A timesheet matching the client's ETag is answered with 304 Not Modified."""
+    make_user("user")
+    client = sign_in(app, "user")
+
+    response = client.get("/dashboard/timesheet")
+    assert response.status_code == 200
+    assert response.cache_control.private
+    assert response.cache_control.no_cache
+    etag, _ = response.get_etag()
+
+    response = client.get("/dashboard/timesheet", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, False)
+
+
+@pytest.mark.usefixtures("calendar")
+def test_timesheet_etag_after_migration(
+    app: Flask, make_user: Callable[..., UserData]
+) -> None:
+    """The ETag of a page that migrated the user matches the migrated user."""
+    user_data = make_user("user")
+    user_data.jobs[0].opening_flexi = None
+    user_data.save()
+    client = sign_in(app, "user")
+
+    etag, _ = client.get("/dashboard/timesheet").get_etag()
+
+    response = client.get("/dashboard/timesheet", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_stale_timesheet_without_refresh_token(
+    app: Flask,
+    calendar: FakeCalendar,
+    make_user: Callable[..., UserData],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Stale timesheets of a user without offline access are synced in the request."""
+    make_user("user")
+    client = sign_in(app, "user")
+    etag, _ = client.get("/dashboard/timesheet").get_etag()
+    headers = {"If-None-Match": etag}
+    assert client.get("/dashboard/timesheet", headers=headers).status_code == 304
+
+    add_work(calendar, 120)
+    monkeypatch.setenv("TIMESHEET_MAX_AGE", "0")
+    response = client.get("/dashboard/timesheet", headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+    assert this_week_minutes("user") == 120
+
+
+def test_stale_timesheet_with_refresh_token(
+    app: Flask,
+    calendar: FakeCalendar,
+    make_user: Callable[..., UserData],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Stale timesheets are answered with 304, and refreshed after the response."""
+
+    def refresh_access_token(refresh_token: str) -> dict[str, Any]:
+        return {"access_token": "access", "refresh_token": refresh_token}
+
+    monkeypatch.setattr(refresh, "refresh_access_token", refresh_access_token)
+    make_user("user", refresh_token="token")
+    client = sign_in(app, "user")
+    etag, _ = client.get("/dashboard/timesheet").get_etag()
+
+    add_work(calendar, 120)
+    monkeypatch.setenv("TIMESHEET_MAX_AGE", "0")
+    response = client.get("/dashboard/timesheet", headers={"If-None-Match": etag})
+    response.close()
+
+    assert response.status_code == 304
+    assert this_week_minutes("user") == 120
+
+
+def test_user_info_cached(app: Flask, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The profile is fetched once per login, and once per request at most."""
+    calls = []
+
+    def get(url: str) -> SimpleNamespace:
+        calls.append(url)
+        return SimpleNamespace(json=lambda: user_info("user"))
+
+    monkeypatch.setattr(google, "google", SimpleNamespace(get=get))
+    with app.test_request_context():
+        assert get_user_info() is get_user_info()
+
+        # a later request in the same session
+        g.pop("user_info")
+        assert get_user_info().id == "user"
+        assert len(calls) == 1
+
+        invalidate_user_info()
+        get_user_info()
+        assert len(calls) == 2
+
+
+def test_load_user_data_once(
+    app: Flask, make_user: Callable[..., UserData], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The user is loaded once per request, storing a new refresh token."""
+    make_user("user", refresh_token="old")
+    calls = []
+    get = UserData.get
+    monkeypatch.setattr(UserData, "get", lambda *args: calls.append(args) or get(*args))
+
+    with app.test_request_context():
+        session["google_oauth_token"] = oauth_token(refresh_token="new")
+        session["user_info"] = user_info("user")
+        app.preprocess_request()
+        assert load_user_data() is load_user_data()
+
+    assert calls == [("user",)]
+    assert get("user").refresh_token == "new"
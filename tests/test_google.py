@@ -0,0 +1,279 @@
+"""Tests of the Google API interface."""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import httplib2
+import pytest
+from flask import Flask
+from googleapiclient.errors import HttpError
+
+from pycaltime import google
+from pycaltime.google import (
+    CALENDAR_METADATA_TTL,
+    EVENT_FIELDS,
+    FETCH_RETRIES,
+    MAX_RESULTS,
+    CalendarEvent,
+    _ConcurrencyLimiter,
+    _execute,
+    _fetch_ahead,
+    get_calendar_list,
+    get_distances,
+    invalidate_calendar_metadata,
+    iterate_events,
+)
+from tests.conftest import TIMEZONE, FakeCalendar, FakeRequest
+
+
+def test_iterate_events(calendar: FakeCalendar) -> None:
+    """Events over many windows are listed once, in start order."""
+    start = date(2024, 1, 1)
+    for i in range(100):
+        calendar.add(
+            f"event{i}",
+            "Meeting",
+            datetime.combine(start, datetime.min.time(), ZoneInfo(TIMEZONE))
+            + timedelta(days=99 - i, hours=9),
+            60,
+        )
+
+    events = list(
+        iterate_events(start, start + timedelta(days=100), ("primary", "other"))
+    )
+
+    assert [x.id for x in events] == [f"event{i}" for i in reversed(range(100))]
+
+
+def test_iterate_events_search(
+    calendar: FakeCalendar, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Each search term is listed in full pages of the used fields, and merged."""
+    start = date(2024, 1, 1)
+    for i, title in enumerate(
+        ["Holiday #work", "Bank holiday #work", "Meeting #work", "Bank #work"]
+    ):
+        calendar.add(
+            f"event{i}",
+            title,
+            datetime.combine(start, datetime.min.time(), ZoneInfo(TIMEZONE))
+            + timedelta(days=i, hours=9),
+            60,
+        )
+    requests = []
+    list_events = calendar.list
+
+    def search(**kwargs: Any) -> FakeRequest:  # noqa: ANN401
+        if "calendarId" not in kwargs:
+            return list_events(**kwargs)
+        requests.append(kwargs)
+        response = list_events(**kwargs).execute()
+        response["items"] = [
+            x for x in response["items"] if kwargs["q"] in x["summary"].lower()
+        ]
+        return FakeRequest(lambda: response)
+
+    monkeypatch.setattr(calendar, "list", search)
+    events = iterate_events(
+        start, start + timedelta(weeks=1), search=("holiday", "bank")
+    )
+
+    assert [x.id for x in events] == ["event0", "event1", "event3"]
+    assert sorted(x["q"] for x in requests) == ["bank", "holiday"]
+    assert all(
+        (x["maxResults"], x["fields"]) == (MAX_RESULTS, EVENT_FIELDS) for x in requests
+    )
+
+
+def test_fetch_ahead() -> None:
+    """Only a limited number of fetches run ahead of the results read."""
+    started = []
+
+    def fetch(task: int) -> list[int]:
+        started.append(task)
+        return [task]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _fetch_ahead(executor, fetch, range(100), 3)
+        assert next(results) == [0]
+        assert next(results) == [1]
+        results.close()
+
+    # fetches 3 and 4 were submitted after reading 0 and 1, and may be cancelled
+    assert set(started) <= {0, 1, 2, 3, 4}
+
+
+@pytest.mark.usefixtures("aws")
+def test_get_distances(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Unknown distances are looked up 25 destinations at a time, and cached."""
+    requests = []
+
+    def distance_matrix(
+        destinations: list[str], **kwargs: object  # noqa: ARG001
+    ) -> dict[str, Any]:
+        requests.append(destinations)
+        elements = [
+            {"status": "OK", "distance": {"value": int(x)}} for x in destinations
+        ]
+        return {"status": "OK", "rows": [{"elements": elements}]}
+
+    monkeypatch.setattr(
+        google,
+        "maps_client",
+        lambda: SimpleNamespace(distance_matrix=distance_matrix),
+    )
+    monkeypatch.setattr(google, "_distances", OrderedDict())
+    now = datetime.now(UTC)
+    events = [
+        CalendarEvent(f"Visit {i}", "", str(i), now, now, str(i)) for i in range(30)
+    ]
+
+    assert get_distances("home", events) == list(range(30))
+    assert get_distances("home", events) == list(range(30))
+    assert [len(x) for x in requests] == [25, 5]
+
+
+def test_calendar_event_decoding() -> None:
+    """An event's hashtags, category and duration follow changes to the event."""
+    start = datetime(2024, 1, 1, 9, tzinfo=UTC)
+    event = CalendarEvent(
+        "Leave #Work", "#holiday", "", start, start + timedelta(hours=2)
+    )
+    assert not hasattr(event, "__dict__")
+    assert event.hashtags() == {"#work", "#holiday"}
+    assert (event.category(), event.duration()) == ("holiday", 120)
+
+    event.description = ""
+    event.title += " #sick"
+    event.finish = start + timedelta(minutes=30)
+    assert event.hashtags() == {"#work", "#sick"}
+    assert (event.category(), event.duration()) == ("sick", 30)
+
+
+def test_calendar_list_cached(
+    app: Flask, calendar: FakeCalendar, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The calendar list is cached in the session until it expires or is invalidated."""
+    calls = []
+    list_calendars = calendar.list
+    monkeypatch.setattr(
+        calendar,
+        "list",
+        lambda **kwargs: calls.append(kwargs) or list_calendars(**kwargs),
+    )
+    now = [1000.0]
+    monkeypatch.setattr(google, "time", lambda: now[0])
+
+    # refreshes outside a request fetch the list every time
+    get_calendar_list()
+    get_calendar_list()
+    assert len(calls) == 2
+
+    with app.test_request_context():
+        get_calendar_list()
+        now[0] += CALENDAR_METADATA_TTL.total_seconds() - 1
+        assert get_calendar_list()[0]["id"] == "primary"
+        assert len(calls) == 3
+
+        now[0] += 1
+        get_calendar_list()
+        assert len(calls) == 4
+
+        invalidate_calendar_metadata()
+        get_calendar_list()
+        assert len(calls) == 5
+
+
+def failing_request(errors: list[HttpError]) -> FakeRequest:
+    """A request that fails with some errors, and then succeeds.
+
+    Args:
+        errors (list[HttpError]): the errors, in order
+
+    Returns:
+        FakeRequest: the request
+    """
+
+    def execute() -> dict[str, Any]:
+        if errors:
+            raise errors.pop(0)
+        return {"items": []}
+
+    return FakeRequest(execute)
+
+
+def http_error(status: int, content: bytes = b"") -> HttpError:
+    """An API error.
+
+    Args:
+        status (int): the http status
+        content (bytes, optional): the response body. Defaults to b"".
+
+    Returns:
+        HttpError: the error
+    """
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+@pytest.fixture
+def delays(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Back off without sleeping.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+
+    Returns:
+        list[float]: the delays slept for, in seconds
+    """
+    slept = []
+    monkeypatch.setattr(google, "sleep", slept.append)
+    return slept
+
+
+def test_execute_backs_off(delays: list[float]) -> None:
+    """Rate limited requests are retried with exponential backoff."""
+    limiter = _ConcurrencyLimiter(4)
+    errors = [http_error(429), http_error(403, b"userRateLimitExceeded")]
+
+    assert _execute(failing_request(errors), limiter=limiter) == {"items": []}
+
+    assert len(delays) == 2
+    assert 0.5 <= delays[0] <= 1 <= delays[1] <= 2
+    assert limiter.limit == 2
+
+
+def test_execute_gives_up(delays: list[float]) -> None:
+    """Other errors are raised at once, and rate limiting after FETCH_RETRIES."""
+    with pytest.raises(HttpError):
+        _execute(failing_request([http_error(403, b"forbidden")]))
+    assert delays == []
+
+    with pytest.raises(HttpError):
+        _execute(failing_request([http_error(429)] * FETCH_RETRIES))
+    assert len(delays) == FETCH_RETRIES - 1
+
+
+def test_concurrency_limiter() -> None:
+    """The limit halves when rate limited, and recovers one success at a time."""
+    limiter = _ConcurrencyLimiter(4)
+    limiter.rate_limited()
+    limiter.rate_limited()
+    limiter.rate_limited()
+    assert limiter.limit == 1
+
+    with ThreadPoolExecutor(max_workers=1) as executor, limiter:
+        # a second request waits for the first
+        waiting = executor.submit(limiter.__enter__)
+        assert not waiting.done()
+        limiter.succeeded()
+        waiting.result(timeout=1)
+        limiter.__exit__()
+    assert limiter.active == 0
+
+    for _ in range(5):
+        limiter.succeeded()
+    assert limiter.limit == 4
@@ -0,0 +1,142 @@
+"""Tests of the calendar push notifications."""
+
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+import httplib2
+import pytest
+from flask import Flask
+from googleapiclient.errors import HttpError
+
+from pycaltime import notifications
+from pycaltime.refresh import needs_refresh, refresh_timesheets, user_context
+from pycaltime.storage import UserData
+from tests.conftest import FakeCalendar
+
+TOKEN = {"access_token": "access", "expires_in": 3600}
+
+
+@pytest.fixture(autouse=True)
+def notification_url(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Watch calendars, with notifications posted to a public address.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+    """
+    monkeypatch.setenv("NOTIFICATION_URL", "https://example.com/notifications")
+
+
+def refresh(app: Flask, user_id: str) -> UserData:
+    """Refresh a user's timesheets, renewing their channels if due.
+
+    Args:
+        app (Flask): the app
+        user_id (str): the user id
+
+    Returns:
+        UserData: the user, as saved
+    """
+    today = datetime.now(UTC).date()
+    with user_context(app, TOKEN):
+        refresh_timesheets(today, today, UserData.get(user_id))
+    return UserData.get(user_id)
+
+
+def notify(app: Flask, channel: dict[str, str], state: str = "exists") -> int:
+    """Post a notification from a channel to the webhook.
+
+    Args:
+        app (Flask): the app
+        channel (dict[str, str]): the channel, as opened with the calendar
+        state (str, optional): the resource state. Defaults to "exists".
+
+    Returns:
+        int: the response status code
+    """
+    response = app.test_client().post(
+        "/notifications/calendar",
+        headers={
+            "X-Goog-Channel-ID": channel["id"],
+            "X-Goog-Channel-Token": channel["token"],
+            "X-Goog-Resource-ID": channel["resourceId"],
+            "X-Goog-Resource-State": state,
+        },
+    )
+    return response.status_code
+
+
+@pytest.fixture
+def channel(
+    app: Flask, calendar: FakeCalendar, make_user: Callable[..., UserData]
+) -> dict[str, str]:
+    """A user whose calendar is watched by an open channel.
+
+    Args:
+        app (Flask): the app fixture
+        calendar (FakeCalendar): the calendar fixture
+        make_user (Callable[..., UserData]): the make_user fixture
+
+    Returns:
+        dict[str, str]: the channel
+    """
+    make_user("user")
+    user_data = refresh(app, "user")
+    (channel,) = calendar.open_channels.values()
+    assert user_data.watch_channels["primary"]["id"] == channel["id"]
+    assert not needs_refresh(user_data)
+    return channel
+
+
+def test_change_notified(app: Flask, channel: dict[str, str]) -> None:
+    """A change notification marks the calendar as changed."""
+    assert notify(app, channel, "sync") == 204
+    assert not needs_refresh(UserData.get("user"))
+
+    assert notify(app, channel) == 204
+    assert needs_refresh(UserData.get("user"))
+
+
+def test_forged_notification(app: Flask, channel: dict[str, str]) -> None:
+    """Notifications without the channel's token are rejected."""
+    assert notify(app, channel | {"token": "forged"}) == 403
+    assert notify(app, channel | {"id": "other"}) == 403
+    assert not needs_refresh(UserData.get("user"))
+
+
+def test_channel_renewed(
+    app: Flask, calendar: FakeCalendar, channel: dict[str, str]
+) -> None:
+    """A channel about to expire is replaced, and then closed."""
+    user_data = UserData.get("user")
+    user_data.watch_channels["primary"]["expiration"] = 0
+    user_data.save()
+
+    user_data = refresh(app, "user")
+
+    (renewed,) = calendar.open_channels.values()
+    assert renewed["id"] != channel["id"]
+    assert user_data.watch_channels["primary"]["id"] == renewed["id"]
+
+
+def test_failed_renewal(
+    app: Flask,
+    calendar: FakeCalendar,
+    channel: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A failure to close a channel keeps the synced timesheets and new channel."""
+    user_data = UserData.get("user")
+    user_data.watch_channels["primary"]["expiration"] = 0
+    user_data.save()
+    before = user_data.last_updated
+
+    def stop_channel(channel_id: str, resource_id: str) -> None:  # noqa: ARG001
+        raise HttpError(httplib2.Response({"status": 500}), b"Backend Error")
+
+    monkeypatch.setattr(notifications, "stop_channel", stop_channel)
+    user_data = refresh(app, "user")
+
+    assert user_data.last_updated > before
+    renewed = user_data.watch_channels["primary"]
+    assert renewed["id"] != channel["id"]
+    assert renewed["id"] in calendar.open_channels
@@ -0,0 +1,122 @@
+"""Tests of the timesheet refresh."""
+
+from collections.abc import Callable
+from json import loads
+from typing import Any
+
+import pytest
+from flask import Flask
+
+from pycaltime import refresh
+from pycaltime.storage import UserData
+from tests.conftest import TIMEZONE, FakeCalendar
+
+
+class FakeLambda:
+    """A Lambda client, recording the invocations."""
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self.invocations: list[dict[str, Any]] = []
+
+    def invoke(self, **kwargs: Any) -> None:  # noqa: ANN401
+        """Record an invocation.
+
+        Args:
+            **kwargs (Any): the invocation
+        """
+        self.invocations.append(kwargs)
+
+
+@pytest.fixture
+def tokens(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Refresh access tokens without Google.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+
+    Returns:
+        list[str]: the refresh tokens used
+    """
+    used = []
+
+    def refresh_access_token(refresh_token: str) -> dict[str, Any]:
+        used.append(refresh_token)
+        return {"access_token": "access", "expires_in": 3600}
+
+    monkeypatch.setattr(refresh, "refresh_access_token", refresh_access_token)
+    return used
+
+
+def test_request_refresh_passes_only_user_id(
+    monkeypatch: pytest.MonkeyPatch, make_user: Callable[..., UserData]
+) -> None:
+    """The refresh invocation carries no OAuth token."""
+    client = FakeLambda()
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "pycaltime")
+    monkeypatch.setattr(refresh, "lambda_client", lambda: client)
+    user_data = make_user("user", refresh_token="token")
+
+    refresh.request_refresh(user_data)
+    refresh.request_refresh(UserData.get("user"))
+
+    (invocation,) = client.invocations
+    assert loads(invocation["Payload"]) == {"pycaltime_refresh": {"user_id": "user"}}
+
+
+@pytest.mark.usefixtures("calendar")
+def test_run_refresh(
+    app: Flask, tokens: list[str], make_user: Callable[..., UserData]
+) -> None:
+    """A refresh signs in with the stored refresh token."""
+    make_user("user", refresh_token="token")
+
+    refresh.run_refresh(app, {"user_id": "user"})
+
+    assert tokens == ["token"]
+    assert UserData.get("user").sync_tokens == {"primary": "sync-token"}
+
+
+def test_missing_weeks_loaded_once(
+    app: Flask,
+    calendar: FakeCalendar,  # noqa: ARG001
+    make_user: Callable[..., UserData],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Weeks missing from the view are synced without loading them again."""
+    user_data = make_user("user")
+    calls = []
+    load_timesheets = user_data.load_timesheets
+    monkeypatch.setattr(
+        user_data,
+        "load_timesheets",
+        lambda *args: calls.append(args) or load_timesheets(*args),
+    )
+
+    with refresh.user_context(app, {"access_token": "access", "expires_in": 3600}):
+        _, start, finish = refresh.view_weeks(user_data)
+        assert not refresh.load_view_timesheets(start, finish, user_data)
+
+    assert calls == [(start, finish)]
+    assert UserData.get("user").sync_tokens == {"primary": "sync-token"}
+
+
+@pytest.mark.usefixtures("calendar")
+def test_refresh_while_migrating(
+    app: Flask, make_user: Callable[..., UserData]
+) -> None:
+    """A user migrated by the refresh keeps the sync state listed alongside it."""
+    user_data = make_user(
+        "user", sync_tokens={"primary": "old-token"}, calendar_timezone=None
+    )
+    user_data.jobs[0].opening_flexi = None
+    user_data.save()
+
+    with refresh.user_context(app, {"access_token": "access", "expires_in": 3600}):
+        user_data = UserData.get("user")
+        refresh.refresh_timesheets(*refresh.view_weeks(user_data)[1:], user_data)
+
+    user_data = UserData.get("user")
+    assert user_data.jobs[0].opening_flexi == 0
+    assert user_data.sync_tokens == {"primary": "sync-token"}
+    assert user_data.calendar_timezone == TIMEZONE
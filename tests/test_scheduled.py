@@ -0,0 +1,135 @@
+"""Tests of the scheduled sync."""
+
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import pytest
+from flask import Flask
+from requests import HTTPError
+
+from pycaltime import refresh, scheduled
+from pycaltime.refresh import REFRESH_TIMEOUT, view_weeks
+from pycaltime.storage import UserData
+from tests.conftest import TIMEZONE, FakeCalendar
+
+
+@pytest.fixture
+def tokens(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Refresh access tokens without Google, revoking the "revoked" refresh token.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): the monkeypatch fixture
+
+    Returns:
+        list[str]: the refresh tokens used
+    """
+    used = []
+
+    def refresh_access_token(refresh_token: str) -> dict[str, Any]:
+        used.append(refresh_token)
+        if refresh_token == "revoked":
+            raise HTTPError(response=SimpleNamespace(status_code=400))
+        return {
+            "access_token": f"access-{refresh_token}",
+            "refresh_token": refresh_token,
+            "expires_in": 3600,
+        }
+
+    monkeypatch.setattr(refresh, "refresh_access_token", refresh_access_token)
+    return used
+
+
+def this_week_minutes(user_data: UserData) -> int:
+    """Minutes worked this week.
+
+    Args:
+        user_data (UserData): the user
+
+    Returns:
+        int: the minutes
+    """
+    user_data = UserData.get(user_data.id)
+    current_week, start, finish = view_weeks(user_data)
+    user_data.load_timesheets(start, finish)
+    return user_data.jobs[0].timesheets[current_week].work
+
+
+@pytest.mark.usefixtures("tokens")
+def test_sync_all_users(
+    app: Flask, calendar: FakeCalendar, make_user: Callable[..., UserData]
+) -> None:
+    """Users with a refresh token are synced, and the others aren't."""
+    calendar.add(
+        "event",
+        "Meeting #work",
+        datetime.now(ZoneInfo(TIMEZONE)).replace(hour=0, minute=0),
+        90,
+    )
+    offline = [make_user(f"offline{i}", refresh_token=f"token{i}") for i in range(3)]
+    online = make_user("online")
+
+    assert scheduled.sync_all_users(app) == {"synced": 3}
+
+    for user_data in offline:
+        assert this_week_minutes(user_data) == 90
+        assert UserData.get(user_data.id).refresh_requested is None
+    assert UserData.get(online.id).jobs[0].timesheets == {}
+
+
+def test_revoked_token(
+    app: Flask,
+    tokens: list[str],
+    calendar: FakeCalendar,  # noqa: ARG001
+    make_user: Callable[..., UserData],
+) -> None:
+    """A revoked refresh token is removed, so the user isn't synced again."""
+    user_data = make_user("user", refresh_token="revoked")
+
+    assert scheduled.sync_all_users(app) == {"failed": 1}
+    assert scheduled.sync_all_users(app) == {}
+
+    assert tokens == ["revoked"]
+    user_data = UserData.get("user")
+    assert user_data.refresh_token is None
+    assert user_data.refresh_requested is None
+
+
+@pytest.mark.usefixtures("tokens", "calendar")
+def test_claimed_user_skipped(app: Flask, make_user: Callable[..., UserData]) -> None:
+    """A user that is already refreshing is skipped, until the claim times out."""
+    make_user("claimed", refresh_token="token", refresh_requested=datetime.now(UTC))
+    make_user(
+        "timed-out",
+        refresh_token="token",
+        refresh_requested=datetime.now(UTC) - REFRESH_TIMEOUT - timedelta(seconds=1),
+    )
+
+    assert scheduled.sync_all_users(app) == {"skipped": 1, "synced": 1}
+
+
+@pytest.mark.usefixtures("tokens", "calendar")
+def test_deadline(app: Flask, make_user: Callable[..., UserData]) -> None:
+    """No users are started after the deadline."""
+    make_user("user", refresh_token="token")
+
+    assert scheduled.sync_all_users(app, deadline=0) == {}
+
+
+def test_claim_refresh_keeps_unsaved_changes(
+    make_user: Callable[..., UserData],
+) -> None:
+    """Claiming a refresh leaves other changes to be saved later."""
+    user_data = make_user("user")
+    user_data.view_past_weeks = 8
+
+    assert user_data.claim_refresh(REFRESH_TIMEOUT)
+    assert user_data.view_past_weeks == 8
+    assert not UserData.get("user").claim_refresh(REFRESH_TIMEOUT)
+
+    user_data.save()
+    user_data = UserData.get("user")
+    assert user_data.view_past_weeks == 8
+    assert user_data.refresh_requested is not None
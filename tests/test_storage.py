@@ -0,0 +1,150 @@
+"""Tests of the storage layout migration."""
+
+from collections.abc import Callable
+from datetime import UTC, date, datetime, timedelta
+from json import dumps
+
+import pytest
+from pynamodb.exceptions import UpdateError
+
+from pycaltime.storage import EventWeek, JobData, Timesheet, TimesheetItem, UserData
+
+WEEK = date(2024, 1, 1)
+
+
+def legacy_job(short_name: str) -> dict[str, dict[str, object]]:
+    """A job stored before timesheets moved to their own table.
+
+    Args:
+        short_name (str): the job's short name
+
+    Returns:
+        dict[str, dict[str, object]]: the dynamodb attribute value of the job
+    """
+    employment_start = JobData.employment_start.serialize(
+        datetime(2024, 1, 1, tzinfo=UTC)
+    )
+    employment_end = JobData.employment_end.serialize(datetime(2099, 1, 5, tzinfo=UTC))
+    timesheets = {"Y2024M01D01": {"work": 600, "holiday": 0, "bank": 0, "sick": 0}}
+    return {
+        "M": {
+            "hashtag": {"S": f"#{short_name.lower()}"},
+            "name": {"S": short_name},
+            "short_name": {"S": short_name},
+            "contracted_hours": {"N": "10"},
+            "annual_holiday_hours": {"N": "0"},
+            "pro_rata_bank_holiday": {"BOOL": False},
+            "employment_start": {"S": employment_start},
+            "employment_end": {"S": employment_end},
+            "timesheets": {"S": dumps(timesheets)},
+        }
+    }
+
+
+@pytest.mark.usefixtures("aws")
+def test_migrate_legacy_user() -> None:
+    """Legacy timesheets and event weeks move to their own tables."""
+    UserData._get_connection().connection.put_item(  # noqa: SLF001
+        UserData.Meta.table_name,
+        "user",
+        attributes={
+            "jobs": {"L": [legacy_job("HCT"), legacy_job("Other")]},
+            "event_weeks": {"S": dumps({"event": WEEK.isoformat()})},
+            "last_updated": {"S": UserData.last_updated.serialize(datetime.now(UTC))},
+        },
+    )
+
+    user_data = UserData.get("user")
+    user_data.load_timesheets(WEEK, WEEK)
+
+    assert [job.opening_flexi for job in user_data.jobs] == [980, 0]
+    user_data = UserData.get("user")
+    assert all(job.legacy_timesheets is None for job in user_data.jobs)
+    assert user_data.legacy_event_weeks is None
+    assert EventWeek.get("user", "event").week == WEEK.isoformat()
+    item = TimesheetItem.get("user", TimesheetItem.make_key("#hct", WEEK))
+    assert item.timesheet().work == 600
+
+
+def test_new_job_opening_balance(make_user: Callable[..., UserData]) -> None:
+    """New jobs start without a flexi time balance, whatever their name."""
+    user_data = make_user("user")
+    user_data.jobs[0].short_name = "HCT"
+    user_data.jobs[0].opening_flexi = None
+    user_data.save()
+
+    user_data = UserData.get("user")
+    user_data.migrate()
+
+    assert UserData.get("user").jobs[0].opening_flexi == 0
+
+
+def test_save_without_changes(
+    make_user: Callable[..., UserData], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Saving an unchanged user writes nothing."""
+    user_data = make_user("user")
+
+    def update(*_: object, **__: object) -> None:
+        raise AssertionError
+
+    monkeypatch.setattr(user_data, "update", update)
+    assert user_data.save() == {}
+
+
+def test_save_changed_attributes(make_user: Callable[..., UserData]) -> None:
+    """Only changed attributes are written, keeping other saves of the user."""
+    make_user("user", refresh_token="token")
+    first, second = UserData.get("user"), UserData.get("user")
+
+    first.view_past_weeks = 8
+    first.save()
+    second.view_future_weeks = 5
+    second.refresh_token = None
+    second.save()
+
+    user_data = UserData.get("user")
+    assert (user_data.view_past_weeks, user_data.view_future_weeks) == (8, 5)
+    assert user_data.refresh_token is None
+
+
+def test_conditional_save(make_user: Callable[..., UserData]) -> None:
+    """A save whose condition fails writes nothing."""
+    user_data = make_user("user")
+    user_data.view_past_weeks = 8
+
+    with pytest.raises(UpdateError):
+        user_data.save(UserData.refresh_token.exists())
+
+    assert UserData.get("user").view_past_weeks == 4
+
+
+def test_running_totals(make_user: Callable[..., UserData]) -> None:
+    """The running totals are updated from the earliest changed week onwards."""
+    weeks = [WEEK + timedelta(weeks=i) for i in range(4)]
+    user_data = make_user("user")
+    for i, week in enumerate(weeks):
+        user_data.jobs[0].timesheets[week] = Timesheet(work=600, holiday=60 * i)
+    user_data.update_flexi()
+    user_data.save()
+
+    # change the third week, with only it loaded
+    user_data = UserData.get("user")
+    user_data.load_timesheets(weeks[2], weeks[3])
+    user_data.jobs[0].timesheets[weeks[2]].sick = 120
+    user_data.update_flexi()
+    user_data.save()
+
+    user_data = UserData.get("user")
+    user_data.load_timesheets(weeks[0], weeks[3] + timedelta(weeks=1))
+    job = user_data.jobs[0]
+    assert [job.timesheets[x].flexi for x in weeks] == [0, 60, 300, 480]
+    assert [job.timesheets[x].hours_to_date() for x in weeks] == [
+        (600, 0, 0, 0),
+        (1200, 60, 0, 0),
+        (1800, 180, 0, 120),
+        (2400, 360, 0, 120),
+    ]
+    assert user_data.totals(job, weeks[1], weeks[3]) == Timesheet(
+        work=1200, holiday=180, sick=120
+    )